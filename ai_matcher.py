@@ -1,13 +1,17 @@
-import openai, os, re, textwrap, logging
+import openai, os, re, json, textwrap, logging
+from metrics import count, timed, timer
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from rate_limiter import TokenBucket
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
 _NUM_RE = re.compile(r"\b(\d{1,3})(?:\s*/\s*100)?\b")   # 0-100 or “85/100”
 
-def score_pair(b1: dict, b2: dict) -> float:
-    """
-    Ask GPT for a 0-100 synergy score and return it as float.
-    """
-    prompt = textwrap.dedent(f"""
+MODEL = "gpt-4o-mini"
+PROMPT_VERSION = "pair-v1"     # bump when the scoring prompts change (invalidates caches)
+FALLBACK_SCORE = 50.0
+
+def _pair_prompt(b1: dict, b2: dict) -> str:
+    return textwrap.dedent(f"""
         You are a world-class spirits sommelier.
         Score the following two bottles as a gift bundle on a 0-100 scale.
         Respond with ONLY the number, no words or symbols.
@@ -16,9 +20,14 @@ def score_pair(b1: dict, b2: dict) -> float:
         Bottle B: {b2['name']} – ${b2['price']:.2f}
     """).strip()
 
-    try:
+def _ask_score(prompt: str) -> float | None:
+    """
+    One chat completion; returns the clamped score, or None if the reply
+    can't be parsed. API errors (incl. 429) propagate to the caller.
+    """
+    with timer("api.score"):
         resp = openai.ChatCompletion.create(
-            model="gpt-4o-mini",
+            model=MODEL,
             temperature=0.1,
             max_tokens=3,              # enough for “85”
             messages=[
@@ -26,14 +35,164 @@ def score_pair(b1: dict, b2: dict) -> float:
                 {"role": "user", "content": prompt}
             ]
         )
-        text = resp.choices[0].message.content.strip()
-        m = _NUM_RE.search(text)
-        if m:
-            val = int(m.group(1))
-            # clamp to 0-100 just in case
-            return max(0, min(val, 100))
-        logging.warning(f"[AI-score] Could not parse → “{text}”")
+    text = resp.choices[0].message.content.strip()
+    m = _NUM_RE.search(text)
+    if m:
+        val = int(m.group(1))
+        # clamp to 0-100 just in case
+        return max(0, min(val, 100))
+    logging.warning(f"[AI-score] Could not parse → “{text}”")
+    return None
+
+@timed("score_pair")
+def score_pair(b1: dict, b2: dict) -> float:
+    """
+    Ask GPT for a 0-100 synergy score and return it as float.
+    """
+    try:
+        val = _ask_score(_pair_prompt(b1, b2))
+        if val is not None:
+            return val
     except Exception as e:
         logging.error(f"[AI-score] {e}")
 
-    return 50.0   # neutral fallback
+    return FALLBACK_SCORE   # neutral fallback
+
+def _batch_prompt(pairs: list[tuple[dict, dict]]) -> str:
+    lines = "\n".join(
+        f"{i}. Bottle A: {b1['name']} – ${b1['price']:.2f} | "
+        f"Bottle B: {b2['name']} – ${b2['price']:.2f}"
+        for i, (b1, b2) in enumerate(pairs, 1)
+    )
+    return textwrap.dedent("""
+        You are a world-class spirits sommelier.
+        Score each numbered pair of bottles below as a gift bundle on a 0-100 scale.
+        Respond with ONLY a JSON array, one object per pair, like
+        [{"id": 1, "score": 85}, {"id": 2, "score": 60}]
+
+    """).lstrip() + lines
+
+_JSON_RE = re.compile(r"\[.*\]", re.S)
+_LINE_RE = re.compile(r"^\s*(\d+)\s*[.:)=\-–]\s*(\d{1,3})\b", re.M)
+
+def _parse_batch(text: str, n: int) -> dict[int, float]:
+    """
+    Pull {position: score} (0-based) out of a batch reply. Accepts the
+    requested [{"id", "score"}] array, a bare [85, 60, …] array of length n,
+    or "1: 85" style lines. Anything out of range or unreadable is left out.
+    """
+    found: dict[int, float] = {}
+    m = _JSON_RE.search(text)
+    if m:
+        try:
+            data = json.loads(m.group(0))
+        except ValueError:
+            data = None
+        if isinstance(data, list):
+            if len(data) == n and all(isinstance(v, (int, float)) for v in data):
+                data = [{"id": i, "score": v} for i, v in enumerate(data, 1)]
+            for item in data:
+                if not isinstance(item, dict):
+                    continue
+                try:
+                    idx, val = int(item["id"]) - 1, float(item["score"])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                if 0 <= idx < n:
+                    found[idx] = max(0, min(val, 100))
+    if not found:
+        for idx, val in _LINE_RE.findall(text):
+            idx = int(idx) - 1
+            if 0 <= idx < n:
+                found[idx] = max(0, min(int(val), 100))
+    return found
+
+def _ask_batch(pairs: list[tuple[dict, dict]]) -> dict[int, float]:
+    """
+    One chat completion for many pairs. A single pair falls back to the
+    cheap one-number prompt. API errors (incl. 429) propagate.
+    """
+    if len(pairs) == 1:
+        val = _ask_score(_pair_prompt(*pairs[0]))
+        return {} if val is None else {0: val}
+
+    with timer("api.score_batch"):
+        resp = openai.ChatCompletion.create(
+            model=MODEL,
+            temperature=0.1,
+            max_tokens=12 * len(pairs) + 10,   # ~ '{"id": 12, "score": 85}, ' each
+            messages=[
+                {"role": "system", "content": "Reply with just a JSON array."},
+                {"role": "user", "content": _batch_prompt(pairs)}
+            ]
+        )
+    count("api.score_batch.pairs", len(pairs))
+    text = resp.choices[0].message.content.strip()
+    found = _parse_batch(text, len(pairs))
+    if len(found) < len(pairs):
+        logging.warning(f"[AI-score] parsed {len(found)}/{len(pairs)} scores → “{text[:200]}”")
+    return found
+
+def score_pairs(
+    pairs: list[tuple[dict, dict]],
+    batch_size: int = 20,
+    max_workers: int = 1,
+    limiter: TokenBucket | None = None,
+    on_result=None,
+    max_retries: int = 5,
+    parse_retries: int = 2,
+) -> list[float]:
+    """
+    Score many pairs, packing up to `batch_size` pairs into each request.
+
+    • batches run on a thread pool, at most `max_workers` in flight
+    • every request first takes a slot from `limiter` (requests + tokens / min)
+    • a 429 makes the limiter back off and the batch is retried
+    • items the reply doesn't cover are re-sent in a smaller follow-up
+      request (up to `parse_retries` rounds); parsed items are kept
+    • anything else – or running out of retries – scores 50, like score_pair
+    • on_result(index, score) fires in the calling thread as results land,
+      so callers can fill their cache while the run is still going
+    """
+    limiter = limiter or TokenBucket()
+    batch_size = max(1, batch_size)
+    scores = [FALLBACK_SCORE] * len(pairs)
+
+    def work(indices: list[int]) -> dict[int, float]:
+        done: dict[int, float] = {}
+        pending, rate_hits, parse_rounds = indices, 0, 0
+        while pending and rate_hits < max_retries:
+            batch = [pairs[i] for i in pending]
+            tokens = len(_batch_prompt(batch)) // 4 + 12 * len(batch) + 20
+            limiter.acquire(tokens)
+            try:
+                found = _ask_batch(batch)
+            except openai.error.RateLimitError as e:
+                rate_hits += 1
+                delay = limiter.backoff()
+                logging.warning(f"[AI-score] 429, backing off {delay:.1f}s → {e}")
+                continue
+            except Exception as e:
+                logging.error(f"[AI-score] {e}")
+                break
+            limiter.relax()
+            done.update((pending[pos], val) for pos, val in found.items())
+            pending = [i for i in pending if i not in done]
+            parse_rounds += 1
+            if parse_rounds > parse_retries:
+                break
+        if pending and rate_hits >= max_retries:
+            logging.error(f"[AI-score] gave up after {max_retries} rate-limit retries")
+        return done
+
+    batches = [list(range(i, min(i + batch_size, len(pairs))))
+               for i in range(0, len(pairs), batch_size)]
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        futures = {pool.submit(work, idxs): idxs for idxs in batches}
+        for fut in as_completed(futures):
+            for idx, val in fut.result().items():
+                scores[idx] = val
+            if on_result:
+                for idx in futures[fut]:
+                    on_result(idx, scores[idx])
+    return scores
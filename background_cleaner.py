@@ -1,29 +1,68 @@
-from rembg import remove
+from rembg import remove, new_session
 from PIL import Image
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
+import argparse
 import io
 import os
 
+IMAGE_EXTS = ('.png', '.jpg', '.jpeg')
+
+# Colors to be made transparent by default (supplier backdrop greys)
+DEFAULT_COLORS = [(243, 244, 238), (236, 235, 235)]
+
 class BackgroundCleaner:
-    def __init__(self, colors_to_remove=None):
+    def __init__(self, colors_to_remove=None, model_name='u2net', tolerance=0):
+        """
+        tolerance: max RGB (Euclidean) distance from a listed color that
+                   still counts as that color; 0 = exact match only.
+        """
         self.colors_to_remove = colors_to_remove or []
+        self.model_name = model_name
+        self.tolerance = tolerance
+        self._session = None    # ONNX model, loaded once on first use
+        self._lut = None        # 2**24 bool table: packed RGB → remove?
+
+    @property
+    def session(self):
+        if self._session is None:
+            self._session = new_session(self.model_name)
+        return self._session
 
     def remove_background(self, image_path):
         with open(image_path, 'rb') as i:
             input_image = i.read()
-        output_image = remove(input_image)
+        output_image = remove(input_image, session=self.session)
         image = Image.open(io.BytesIO(output_image)).convert("RGBA")
         return image
 
+    def _color_lut(self):
+        """
+        Build (once) a lookup table over every packed 0xRRGGBB value marking
+        the colors within `tolerance` of any color in colors_to_remove.
+        Only the (2t+1)³ cube around each color is ever evaluated.
+        """
+        if self._lut is None:
+            lut = np.zeros(1 << 24, dtype=bool)
+            t = int(self.tolerance)
+            offs = np.arange(-t, t + 1)
+            dr, dg, db = np.meshgrid(offs, offs, offs, indexing='ij')
+            near = dr ** 2 + dg ** 2 + db ** 2 <= self.tolerance ** 2
+            for r, g, b in self.colors_to_remove:
+                rr, gg, bb = r + dr[near], g + dg[near], b + db[near]
+                ok = (rr >= 0) & (rr < 256) & (gg >= 0) & (gg < 256) & (bb >= 0) & (bb < 256)
+                lut[(rr[ok] << 16) | (gg[ok] << 8) | bb[ok]] = True
+            self._lut = lut
+        return self._lut
+
     def remove_specific_colors(self, image):
         if not self.colors_to_remove:
             return image
 
-        data = np.array(image)
-        mask = np.zeros(data.shape[:2], dtype=bool)
-
-        for color in self.colors_to_remove:
-            mask |= np.all(data[:, :, :3] == color, axis=-1)
+        data = np.array(image.convert('RGBA'))
+        rgb = data[:, :, :3].astype(np.uint32)
+        packed = (rgb[:, :, 0] << 16) | (rgb[:, :, 1] << 8) | rgb[:, :, 2]
+        mask = self._color_lut()[packed]        # one pass, any number of colors
 
         data[mask] = [255, 255, 255, 0]
         return Image.fromarray(data, 'RGBA')
@@ -33,32 +72,93 @@ class BackgroundCleaner:
         white_bg.paste(image, (0, 0), image)
         return white_bg.convert('RGB')  # RGB for Shopify compatibility
 
-# Directories
-input_dir = 'cleam'  # Update path if needed
-output_dir = 'cleaned'  # Output path
+    def clean_image(self, input_path, output_path):
+        image = self.remove_background(input_path)
+        image = self.remove_specific_colors(image)
+        image = self.add_white_background(image)
+        image.save(output_path)
+        return output_path
+
+# -- batch API ----------------------------------------------------
+_worker_cleaner = None
 
-# Ensure output folder exists
-os.makedirs(output_dir, exist_ok=True)
+def _init_worker(colors_to_remove, model_name, tolerance):
+    global _worker_cleaner
+    _worker_cleaner = BackgroundCleaner(colors_to_remove, model_name, tolerance)
+    _worker_cleaner.session     # load the model once per worker
 
-# Colors to be made transparent (optional)
-colors_to_remove = [(243, 244, 238), (236, 235, 235)]
+def _clean_one(job):
+    input_path, output_path = job
+    try:
+        _worker_cleaner.clean_image(input_path, output_path)
+        return output_path, None
+    except Exception as e:      # a string always pickles; some PIL/onnxruntime errors don't
+        return output_path, f"{type(e).__name__}: {e}"
 
-# Initialize cleaner
-cleaner = BackgroundCleaner(colors_to_remove=colors_to_remove)
+def _is_up_to_date(input_path, output_path):
+    return (os.path.exists(output_path)
+            and os.path.getmtime(output_path) >= os.path.getmtime(input_path))
 
-# Process images
-for filename in os.listdir(input_dir):
-    if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
+def clean_directory(input_dir, output_dir, colors_to_remove=DEFAULT_COLORS,
+                    tolerance=0, workers=None, model_name='u2net', force=False):
+    """
+    Clean every image in input_dir into output_dir on a process pool
+    (workers=None → one per CPU core). Outputs newer than their input are
+    skipped unless force=True. Returns {'done', 'skipped', 'failed'} counts.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    jobs, skipped = [], 0
+    for filename in sorted(os.listdir(input_dir)):
+        if not filename.lower().endswith(IMAGE_EXTS):
+            continue
         input_path = os.path.join(input_dir, filename)
         output_path = os.path.join(output_dir, filename)
+        if not force and _is_up_to_date(input_path, output_path):
+            skipped += 1
+            continue
+        jobs.append((input_path, output_path))
+
+    done = failed = 0
+    if jobs:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(colors_to_remove, model_name, tolerance)) as pool:
+            for output_path, err in pool.map(_clean_one, jobs, chunksize=4):
+                if err is None:
+                    done += 1
+                    print(f"✅ Saved cleaned image: {output_path}")
+                else:
+                    failed += 1
+                    print(f"❌ Failed on {os.path.basename(output_path)}: {err}")
+
+    return {'done': done, 'skipped': skipped, 'failed': failed}
+
+# -- CLI ----------------------------------------------------------
+def _parse_color(text):
+    parts = tuple(int(p) for p in text.split(','))
+    if len(parts) != 3 or not all(0 <= p < 256 for p in parts):
+        raise argparse.ArgumentTypeError(f"expected R,G,B (0-255), got {text!r}")
+    return parts
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Batch background removal for supplier photos.")
+    ap.add_argument('input_dir', nargs='?', default='cleam')
+    ap.add_argument('output_dir', nargs='?', default='cleaned')
+    ap.add_argument('--color', dest='colors', action='append', type=_parse_color,
+                    help="R,G,B to make transparent (repeatable; default: supplier greys)")
+    ap.add_argument('--tolerance', type=float, default=0,
+                    help="RGB distance around each color that is also removed")
+    ap.add_argument('--workers', type=int, default=None)
+    ap.add_argument('--model', default='u2net')
+    ap.add_argument('--force', action='store_true', help="redo images that are up to date")
+    args = ap.parse_args(argv)
 
-        try:
-            image = cleaner.remove_background(input_path)
-            image = cleaner.remove_specific_colors(image)
-            image = cleaner.add_white_background(image)
-            image.save(output_path)
-            print(f"✅ Saved cleaned image: {output_path}")
-        except Exception as e:
-            print(f"❌ Failed on {filename}: {e}")
+    stats = clean_directory(args.input_dir, args.output_dir,
+                            colors_to_remove=args.colors or DEFAULT_COLORS,
+                            tolerance=args.tolerance, workers=args.workers,
+                            model_name=args.model, force=args.force)
+    print(f"🎉 Background cleaning complete. "
+          f"{stats['done']} cleaned, {stats['skipped']} up to date, {stats['failed']} failed.")
 
-print("🎉 Background cleaning complete.")
+if __name__ == '__main__':
+    main()
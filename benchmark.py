@@ -0,0 +1,410 @@
+# benchmark.py
+# ---------------------------------------------------------------
+# Offline benchmarks for the hot paths – no network, no real OpenAI.
+#   python benchmark.py                          → all suites, JSON in bench/bench_<commit>.json
+#   python benchmark.py --suite bundler --sizes 100,1000,20000
+#   python benchmark.py --compare bench/bench_abc1234.json
+#   python benchmark.py --suite parse --fixtures saved_pages/
+# Synthetic catalogs are seeded, so runs are comparable across commits.
+# ---------------------------------------------------------------
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import types
+
+# generous limits so the fake API is never throttled by our own limiter
+os.environ.setdefault("AI_REQUESTS_PER_MIN", "1000000")
+os.environ.setdefault("AI_TOKENS_PER_MIN", "1000000000")
+os.environ.setdefault("DESC_REQUESTS_PER_MIN", "1000000")
+os.environ.setdefault("DESC_TOKENS_PER_MIN", "1000000000")
+
+BENCH_DIR = "bench"                 # default home for result JSON (gitignored)
+
+BRANDS = ["Casa Azul", "Don Noble", "Dragones", "El Tesoro", "Fortaleza", "Herradura",
+          "Lalo", "Ocho", "Patrón", "Siete Leguas", "Tapatio", "Volcán"]
+EXPRESSIONS = ["Blanco", "Reposado", "Añejo", "Extra Añejo", "Cristalino"]
+VOLUMES = ["750ml", "750 ml", "1.5L", "1.75 L", "375ml", ""]
+
+
+# -- synthetic data -----------------------------------------------
+def synthetic_catalog(n: int, seed: int = 0) -> list[dict]:
+    """n scraper-shaped bottle dicts; roughly 20 bottles per brand."""
+    r = random.Random(seed)
+    brands = [f"{r.choice(BRANDS)} {i}" for i in range(max(1, n // 20))]
+    bottles = []
+    for i in range(n):
+        brand = r.choice(brands)
+        name = f"{brand} {r.choice(EXPRESSIONS)} Tequila {r.choice(VOLUMES)} {i}".replace("  ", " ")
+        bottles.append({
+            "name": name,
+            "brand": brand,
+            "price": round(r.uniform(20, 500), 2),
+            "image_url": f"https://cdn.example/{i}.jpg",
+            "image_path": "",
+        })
+    return bottles
+
+
+def synthetic_bundles(n: int, seed: int = 0):
+    """Stream n bundle dicts as the pipeline hands them to the exporter."""
+    r = random.Random(seed)
+    categories = ["Tequila", "Gin", "Rum", "Whiskey", ""]
+    for i in range(n):
+        name = f"Casa {i} Añejo 750ml & Don {i} Reposado 750ml"
+        yield {
+            "name": name,
+            "price": round(r.uniform(40, 900), 2),
+            "bottles": [],
+            "description": f"<p><strong>{name}</strong> – smooth, oaky, a little vanilla.</p>" * 3,
+            "category": r.choice(categories),
+            "image_src": f"bundle_images/{i}.jpg",
+        }
+
+
+def synthetic_page(n_cards: int = 48, seed: int = 0) -> str:
+    """A Shopify-style collection page: n grid-item cards between nav/footer filler."""
+    r = random.Random(seed)
+    cards = []
+    for i in range(n_cards):
+        brand = r.choice(BRANDS)
+        name = f"{brand} {r.choice(EXPRESSIONS)} Tequila {r.choice(VOLUMES)}".strip()
+        img = r.choice([f'data-src="//cdn.example/files/{seed}_{i}.jpg?v=1"',
+                        f'data-srcset="//cdn.example/files/{seed}_{i}.png 600w, //cdn.example/x.png 1200w"',
+                        f'src="https://cdn.example/files/{i}.jpg"'])
+        price = f"${r.uniform(20, 900):,.2f}"
+        cards.append(
+            f'<div class="grid-item grid-product" data-product-id="{seed}{i}">'
+            f'<div class="grid-item__content"><a href="/products/{seed}-{i}" class="grid-item__link">'
+            f'<div class="grid-product__image-wrap"><img class="grid-product__image lazyload" {img} alt=""></div>'
+            f'<div class="grid-item__meta"><div class="grid-product__title">{name}</div>'
+            f'<div class="grid-product__vendor">{brand}</div>'
+            f'<div class="grid-product__price"><span class="grid-product__price--current">'
+            f'<span aria-hidden="true">{price}</span> <span class="visually-hidden">{price}</span>'
+            f'</span></div></div></a></div></div>')
+    nav = "<nav>" + "".join(f'<a href="/c/{i}" class="site-nav__link">Link {i}</a>' for i in range(400)) + "</nav>"
+    script = "<script>" + "var theme = {};" * 2000 + "</script>"
+    return (f"<!doctype html><html><head><title>Tequila</title>{script}</head><body>{nav}"
+            f"<div class=\"grid grid--uniform\">{''.join(cards)}</div><footer>{nav}</footer></body></html>")
+
+
+# -- fake OpenAI ----------------------------------------------------
+_PAIR_LINE = re.compile(r"^(\d+)\. Bottle A:", re.M)
+
+
+class FakeOpenAI:
+    """
+    Stand-in for openai.ChatCompletion.create: sleeps `latency` seconds
+    and answers in the shape each caller expects (batched JSON scores,
+    a single score, or an HTML description). Scores are deterministic.
+    """
+
+    def __init__(self, latency: float = 0.05):
+        self.latency = latency
+        self.calls = 0
+
+    def create(self, messages=(), **kw):
+        self.calls += 1
+        time.sleep(self.latency)
+        prompt = messages[-1]["content"]
+        ids = _PAIR_LINE.findall(prompt)
+        if ids:
+            text = json.dumps([{"id": int(i), "score": _score(prompt, i)} for i in ids])
+        elif "Bottle A:" in prompt:
+            text = str(_score(prompt, "1"))
+        else:
+            text = "<p><strong>Fake</strong> tasting notes.</p>"
+        msg = type("Message", (), {"content": text})()
+        return type("Response", (), {"choices": [type("Choice", (), {"message": msg})()]})()
+
+    def install(self):
+        import openai
+        openai.ChatCompletion.create = self.create
+        return self
+
+
+def _score(prompt: str, idx: str) -> int:
+    return int(hashlib.md5(f"{idx}:{prompt[-80:]}".encode()).hexdigest()[:4], 16) % 101
+
+
+# -- timing ---------------------------------------------------------
+def timed(fn, repeat: int) -> dict:
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - t0)
+    return {"best": min(runs), "mean": sum(runs) / len(runs), "runs": runs}
+
+
+def record(results: list, name: str, params: dict, timing: dict, **extra):
+    entry = {"name": name, "params": params, **timing, **extra}
+    results.append(entry)
+    label = " ".join(f"{k}={v}" for k, v in params.items())
+    print(f"  {name:<36} {label:<24} best {timing['best'] * 1000:10.2f} ms")
+
+
+# -- suites ---------------------------------------------------------
+def bench_bundler(results, args, tmp):
+    import bundler
+    for n in args.sizes:
+        bottles = synthetic_catalog(n)
+        record(results, "bundler.generate_bundles", {"bottles": n},
+               timed(lambda: _quiet(bundler.generate_bundles, bottles, set()), args.repeat))
+        record(results, "bundler.generate_bundles", {"bottles": n, "k": 3},
+               timed(lambda: _quiet(bundler.generate_bundles, bottles, set(), k=3), args.repeat))
+
+
+def bench_ai_bundler(results, args, tmp):
+    # importing bundlertest opens its score cache – keep it off the production file
+    os.environ["SCORE_CACHE_DB"] = os.path.join(tmp, "ai_bundle_scores.sqlite")
+    import bundlertest
+    from sqlite_cache import SqliteCache
+    fake = FakeOpenAI(args.latency).install()
+    for n in [s for s in args.sizes if s <= args.ai_max]:
+        bottles = synthetic_catalog(n)
+        calls = []
+
+        def run():
+            # fresh (cold) score cache every run
+            bundlertest._SCORE_CACHE = SqliteCache(
+                os.path.join(tmp, f"scores_{n}_{len(calls)}.sqlite"), namespace="bench")
+            before = fake.calls
+            _quiet(bundlertest.generate_bundles, bottles, set(), prerank_k=args.prerank_k)
+            calls.append(fake.calls - before)
+
+        record(results, "bundlertest.generate_bundles",
+               {"bottles": n, "latency": args.latency, "prerank_k": args.prerank_k},
+               timed(run, args.repeat), api_calls=calls[-1])
+
+
+def bench_helpers(results, args, tmp):
+    from bundler import extract_volume, round_to_99
+    names = [b["name"] for b in synthetic_catalog(max(args.sizes))]
+    prices = [random.Random(1).uniform(10, 1000) for _ in names]
+
+    def parse_all():
+        extract_volume.cache_clear()                # lru_cache'd: time parsing, not cache hits
+        return [extract_volume(s) for s in names]
+
+    record(results, "bundler.extract_volume", {"calls": len(names)},
+           timed(parse_all, args.repeat))
+    record(results, "bundler.round_to_99", {"calls": len(prices)},
+           timed(lambda: [round_to_99(p) for p in prices], args.repeat))
+
+
+def bench_export(results, args, tmp):
+    from csv_exporter import export_to_shopify_csv
+    for rows in args.rows:
+        out = os.path.join(tmp, f"export_{rows}.csv")
+        files = []
+        record(results, "csv_exporter.export", {"rows": rows},
+               timed(lambda: files.append(_quiet(export_to_shopify_csv, synthetic_bundles(rows), out)),
+                     args.repeat),
+               bytes=sum(os.path.getsize(f) for f in files[-1]))
+
+
+def _stub_rembg() -> types.ModuleType:
+    """rembg stand-in: no model download, no ONNX – remove() hands the image back."""
+    stub = types.ModuleType("rembg")
+    stub.new_session = lambda model_name="u2net", *a, **kw: None
+    stub.remove = lambda data, *a, **kw: data
+    return stub
+
+
+def bench_composer(results, args, tmp):
+    sys.modules["rembg"] = _stub_rembg()            # before image_composer imports it
+    from image_composer import ImageComposer
+    from PIL import Image
+
+    r = random.Random(0)
+    paths = []
+    for i in range(args.images):
+        p = os.path.join(tmp, f"bottle_{i}.jpg")
+        Image.new("RGB", (r.randint(300, 700), r.randint(700, 1400)),
+                  (r.randrange(256), r.randrange(256), r.randrange(256))).save(p, quality=90)
+        paths.append(p)
+    jobs = [([paths[i], paths[(i + 1) % len(paths)]], os.path.join(tmp, f"bundle_{i}.jpg"))
+            for i in range(len(paths))]
+
+    for label, cache_dir in (("no cache", None), ("warm cut-out cache", os.path.join(tmp, "cutouts"))):
+        composer = ImageComposer(cache_dir=cache_dir)
+        if cache_dir:
+            for job in jobs:                        # warm it
+                composer.create_bundle_image(*job)
+        record(results, "image_composer.create_bundle_image", {"bundles": len(jobs), "mode": label},
+               timed(lambda: [composer.create_bundle_image(*job) for job in jobs], args.repeat))
+
+
+def bench_parse(results, args, tmp):
+    try:
+        import scraper
+    except ImportError as e:
+        print(f"  [skip] parse: {e}")
+        results.append({"name": "scraper.parse_products", "skipped": str(e)})
+        return
+    import glob
+
+    folder = args.fixtures or os.path.join(tmp, "fixtures")
+    files = sorted(glob.glob(os.path.join(folder, "*.html")))
+    if not files:                                   # save synthetic pages once, reuse after
+        os.makedirs(folder, exist_ok=True)
+        for n in range(args.pages):
+            with open(os.path.join(folder, f"page_{n + 1}.html"), "w", encoding="utf-8") as f:
+                f.write(synthetic_page(48, seed=n))
+        files = sorted(glob.glob(os.path.join(folder, "*.html")))
+    pages = []
+    for path in files:
+        with open(path, "r", encoding="utf-8") as f:
+            pages.append(f.read())
+
+    old = [_quiet(scraper.parse_products, h) for h in pages]
+    new = [_quiet(scraper.parse_products_fast, h) for h in pages]
+    same = old == new
+    if not same:
+        print("  [!] parse_products_fast differs from parse_products on these fixtures")
+    for fn in (scraper.parse_products, scraper.parse_products_fast):
+        record(results, f"scraper.{fn.__name__}", {"pages": len(pages)},
+               timed(lambda: [_quiet(fn, h) for h in pages], args.repeat), identical=same)
+
+    def fetched():                                  # pages arriving at browser-ish speed
+        for n, h in enumerate(pages, 1):
+            time.sleep(args.fetch_latency)
+            yield n, h
+
+    record(results, "scrape.fetch+parse", {"pages": len(pages), "mode": "sequential"},
+           timed(lambda: [_quiet(scraper.parse_products, h) for _, h in fetched()], args.repeat))
+    record(results, "scrape.fetch+parse", {"pages": len(pages), "mode": "overlapped"},
+           timed(lambda: _quiet(list, scraper._parsed_pages(fetched())), args.repeat))
+
+
+def bench_describe(results, args, tmp):
+    from description_builder import DescriptionService
+    fake = FakeOpenAI(args.latency).install()
+    names = [f"Bundle {i}" for i in range(args.descriptions)]
+    calls = []
+
+    def run():
+        svc = DescriptionService(os.path.join(tmp, f"desc_{len(calls)}.sqlite"))
+        before = fake.calls
+        svc.prefetch(names)
+        for n in names:
+            svc.get(n)
+        svc.close()
+        calls.append(fake.calls - before)
+
+    record(results, "DescriptionService.get", {"bundles": len(names), "latency": args.latency},
+           timed(run, args.repeat), api_calls=calls[-1])
+
+
+SUITES = {
+    "bundler": bench_bundler,
+    "ai_bundler": bench_ai_bundler,
+    "helpers": bench_helpers,
+    "export": bench_export,
+    "composer": bench_composer,
+    "parse": bench_parse,
+    "describe": bench_describe,
+}
+
+
+# -- plumbing -------------------------------------------------------
+def _quiet(fn, *a, **kw):
+    """Call fn with its progress prints swallowed."""
+    stdout, sys.stdout = sys.stdout, io.StringIO()
+    try:
+        return fn(*a, **kw)
+    finally:
+        sys.stdout = stdout
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))
+                              ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _key(entry: dict) -> str:
+    return entry["name"] + json.dumps(entry.get("params", {}), sort_keys=True)
+
+
+def compare(current: list, baseline_path: str):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {_key(e): e for e in json.load(f)["results"] if "best" in e}
+    print(f"\nvs {baseline_path}:")
+    for e in current:
+        old = baseline.get(_key(e))
+        if old and "best" in e:
+            ratio = e["best"] / old["best"] if old["best"] else float("inf")
+            flag = "  ← slower" if ratio > 1.10 else ""
+            print(f"  {e['name']:<36} {ratio:6.2f}x{flag}")
+
+
+def _ints(text: str) -> list[int]:
+    return [int(x) for x in text.split(",") if x]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Offline benchmarks for bundling, export and imaging.")
+    ap.add_argument("--suite", action="append", choices=list(SUITES),
+                    help="run only these suites (repeatable; default: all)")
+    ap.add_argument("--sizes", type=_ints, default=[100, 1000, 5000, 20000],
+                    help="catalog sizes, comma-separated")
+    ap.add_argument("--ai-max", type=int, default=1000,
+                    help="largest catalog scored through the fake OpenAI")
+    ap.add_argument("--prerank-k", type=int, default=None,
+                    help="pairs sent to the fake AI after local pre-rank (0 = all; default: AI_PRERANK_K)")
+    ap.add_argument("--rows", type=_ints, default=[10000, 100000], help="CSV export row counts")
+    ap.add_argument("--images", type=int, default=20, help="bundles composed per run")
+    ap.add_argument("--descriptions", type=int, default=100)
+    ap.add_argument("--fixtures", default=None, metavar="DIR",
+                    help="saved collection pages (*.html) for the parse suite; "
+                         "filled with synthetic pages if empty")
+    ap.add_argument("--pages", type=int, default=10, help="synthetic pages written for --fixtures")
+    ap.add_argument("--fetch-latency", type=float, default=0.05,
+                    help="simulated page load time (s) for the overlapped fetch+parse run")
+    ap.add_argument("--latency", type=float, default=0.05, help="fake OpenAI latency (s)")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--out", default=None, help="JSON results (default: bench/bench_<commit>.json)")
+    ap.add_argument("--compare", default=None, metavar="JSON", help="earlier results to diff against")
+    args = ap.parse_args(argv)
+
+    commit = _git_commit()
+    results: list[dict] = []
+    with tempfile.TemporaryDirectory(prefix="bench_") as tmp:
+        for name in args.suite or SUITES:
+            print(f"[bench] {name}")
+            SUITES[name](results, args, tmp)
+
+    report = {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "args": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "results": results,
+    }
+    out = args.out or os.path.join(BENCH_DIR, f"bench_{commit}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"[✔] Results → {out}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+# browser_pool.py
+# ---------------------------------------------------------------
+# Headless Chrome workers for pages that really need JS rendering.
+#  • drivers start on first use and stay alive across pages and
+#    categories (one pool per run, shared like the HTTP session)
+#  • the chromedriver binary path is resolved once and remembered on
+#    disk, so webdriver_manager doesn't re-check it every run
+#  • pages go to idle drivers in parallel; results come back in order
+#  • a driver that crashes is quit and replaced, and the page retried
+#  • no fixed sleeps: wait for the product grid, then for it to settle
+# ---------------------------------------------------------------
+
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from selenium import webdriver
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+from metrics import count, timer
+
+DRIVER_PATH_FILE = ".chromedriver_path"     # cached ChromeDriverManager().install() result
+BROWSER_WORKERS = 3
+
+_driver_path: str | None = None
+_driver_path_lock = threading.Lock()
+
+
+def driver_path() -> str:
+    """
+    chromedriver binary: $CHROMEDRIVER_PATH, else the path remembered in
+    DRIVER_PATH_FILE (if the file still exists), else resolved through
+    webdriver_manager once and remembered.
+    """
+    global _driver_path
+    with _driver_path_lock:
+        if _driver_path and os.path.exists(_driver_path):
+            return _driver_path
+        path = os.getenv("CHROMEDRIVER_PATH", "")
+        if not path and os.path.exists(DRIVER_PATH_FILE):
+            with open(DRIVER_PATH_FILE, "r", encoding="utf-8") as f:
+                path = f.read().strip()
+        if not path or not os.path.exists(path):
+            from webdriver_manager.chrome import ChromeDriverManager
+            with timer("browser.driver_install"):
+                path = ChromeDriverManager().install()
+            with open(DRIVER_PATH_FILE, "w", encoding="utf-8") as f:
+                f.write(path)
+        _driver_path = path
+        return path
+
+
+def _alive(driver) -> bool:
+    """False once the browser or its session is gone."""
+    try:
+        driver.execute_script("return 1")
+        return True
+    except Exception:           # WebDriverException, or urllib3 errors once chromedriver is gone
+        return False
+
+
+def _quit(driver):
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+
+class _GridSettled:
+    """
+    WebDriverWait condition: the document has loaded and the number of
+    grid items hasn't changed since the previous poll (lazy sections done).
+    """
+
+    def __init__(self, css: str):
+        self.css = css
+        self.last = -1
+
+    def __call__(self, driver) -> bool:
+        n = len(driver.find_elements(By.CSS_SELECTOR, self.css))
+        ready = driver.execute_script("return document.readyState") == "complete"
+        settled = ready and n > 0 and n == self.last
+        self.last = n
+        return settled
+
+
+class BrowserPool:
+    """
+    pool = BrowserPool(3)
+    for page_num, html in pool.pages(url, total_pages): …
+    pool.close()
+
+    Drivers are created lazily, up to `size`; a pool that is never used
+    never starts Chrome.
+    """
+
+    def __init__(self, size: int = BROWSER_WORKERS, headless: bool = True,
+                 wait_timeout: float = 10, settle_poll: float = 0.25,
+                 grid_css: str = ".grid-item"):
+        self.size = max(1, size)
+        self.headless = headless
+        self.wait_timeout = wait_timeout
+        self.settle_poll = settle_poll
+        self.grid_css = grid_css
+        self._idle: queue.Queue = queue.Queue()
+        self._all: list = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    # -- drivers ----------------------------------------------------
+    def _new_driver(self):
+        options = Options()
+        if self.headless:
+            options.add_argument("--headless=new")
+        options.add_argument("--window-size=1920,1080")
+        options.add_argument("--disable-gpu")
+        options.add_argument("--disable-dev-shm-usage")
+        options.page_load_strategy = "eager"        # DOM ready is enough; we wait for the grid
+        with timer("browser.start"):
+            return webdriver.Chrome(service=Service(driver_path()), options=options)
+
+    def _acquire(self):
+        """An idle driver, a new one if the pool isn't full yet, else wait for one."""
+        while True:
+            if self._closed:
+                raise RuntimeError("browser pool is closed")
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            with self._lock:
+                grow = len(self._all) < self.size
+                if grow:
+                    self._all.append(None)          # reserve the slot before starting Chrome
+            if grow:
+                break
+            try:
+                return self._idle.get(timeout=0.5)
+            except queue.Empty:
+                continue                            # a replaced driver may have freed a slot
+        try:
+            driver = self._new_driver()
+        except Exception:
+            with self._lock:
+                self._all.remove(None)
+            raise
+        with self._lock:
+            self._all[self._all.index(None)] = driver
+        return driver
+
+    def _release(self, driver):
+        with self._lock:
+            if not self._closed:
+                self._idle.put(driver)
+                return
+            if driver in self._all:
+                self._all.remove(driver)
+        _quit(driver)                               # came back after close()
+
+    def _discard(self, driver):
+        """Quit a broken driver and free its slot; the next _acquire() starts a fresh one."""
+        count("browser.replaced")
+        with self._lock:
+            if driver in self._all:
+                self._all.remove(driver)
+        _quit(driver)
+
+    # -- pages ------------------------------------------------------
+    def _load(self, driver, url: str) -> str | None:
+        """Page source once the grid has rendered and settled; None on timeout."""
+        with timer("scrape.page_fetch"):
+            driver.get(url)
+        try:
+            with timer("scrape.browser_wait"):
+                wait = WebDriverWait(driver, self.wait_timeout, poll_frequency=self.settle_poll)
+                wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, self.grid_css)))
+                wait.until(_GridSettled(self.grid_css))
+        except TimeoutException:
+            return None
+        return driver.page_source
+
+    def fetch(self, url: str, retries: int = 1) -> str | None:
+        """Render one page on an idle driver. A crashed driver is replaced and the page retried."""
+        for attempt in range(retries + 1):
+            driver = self._acquire()
+            healthy = True
+            try:
+                return self._load(driver, url)
+            except TimeoutException:
+                return None
+            except Exception as e:      # a dead chromedriver surfaces as urllib3 errors, not only WebDriverException
+                healthy = _alive(driver)            # alive: page-level error (DNS, net::…)
+                if healthy or attempt == retries:
+                    print(f"[!] Browser failed on {url}: {getattr(e, 'msg', None) or e}")
+                    return None
+            finally:                                # every exit releases or replaces the driver
+                if healthy:
+                    self._release(driver)
+                else:
+                    self._discard(driver)
+        return None
+
+    def pages(self, category_url: str, total_pages: int):
+        """Yield (page_num, page_source | None) in page order, pages rendered in parallel."""
+        with ThreadPoolExecutor(max_workers=min(self.size, max(1, total_pages)),
+                                thread_name_prefix="browser") as ex:
+            futures = [ex.submit(self.fetch, f"{category_url}?page={n}")
+                       for n in range(1, total_pages + 1)]
+            try:
+                for page_num, fut in enumerate(futures, 1):
+                    yield page_num, fut.result()
+            finally:
+                for fut in futures:      # caller stopped early – drop queued pages
+                    fut.cancel()
+
+    def close(self):
+        """Quit the idle drivers now; drivers still busy are quit as they're released."""
+        with self._lock:
+            self._closed = True
+            idle = []
+            while True:
+                try:
+                    idle.append(self._idle.get_nowait())
+                except queue.Empty:
+                    break
+            self._all = [d for d in self._all if d not in idle]
+        for driver in idle:
+            _quit(driver)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
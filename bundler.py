@@ -1,11 +1,16 @@
 # bundler.py
 
+import heapq
 import itertools
 import math
-import re
-def generate_bundles(bottles: list[dict], existing_bundles: set, max_bundles=10) -> list[dict]:
+import numpy as np
+from catalog import Catalog, extract_volume
+from pair_engine import same_brand_pair_chunks, cross_brand_pair_chunks
+def generate_bundles(bottles: list[dict] | Catalog, existing_bundles: set, max_bundles=10,
+                     k: int = 2) -> list[dict]:
     """
     Creates a list of new bundle dicts from 'bottles' (only 750ml or 1.5L).
+    'bottles' may be the scraper's list of dicts or a prebuilt Catalog.
     Each bundle:
        - name: e.g. "BottleA & BottleB"
        - price: (sum - 5) -> round to .99
@@ -16,87 +21,154 @@ def generate_bundles(bottles: list[dict], existing_bundles: set, max_bundles=10)
       2) cross-brand combos within a $10 price difference
 
     We skip duplicates in 'existing_bundles'.
-    We then sort by price descending and limit to 'max_bundles'.
+    We then keep the 'max_bundles' highest-priced pairs. Pairs are handled
+    as index arrays in chunks, so memory stays bounded and names are only
+    formatted for the survivors.
+
+    k=3 builds 3-bottle gift sets instead ("A & B & C", price (sum - 5) -> .99)
+    under the same rules applied to every pair inside the set: all one
+    brand, or any two different-brand bottles within $10 of each other.
+    See _top_triples – the search is pruned, the full cube is never built.
     """
+    if k not in (2, 3):
+        raise ValueError(f"k must be 2 or 3, got {k}")
 
     # 1) Filter bottles by valid volume (750 ml or 1500 ml).
-    valid_bottles = []
-    for b in bottles:
-        vol = extract_volume(b['name']) or extract_volume(b['brand'])
-        if vol in (750, 1500):
-            valid_bottles.append(b)
-    if not valid_bottles:
+    catalog = Catalog.from_bottles(bottles)
+    valid = catalog.where(np.isin(catalog.volume, (750, 1500)))
+    if not len(valid):
         print("[!] No valid bottles found (750ml or 1.5L). No bundles generated.")
         return []
 
-    # 2) Generate brand combos
-    brand_map = {}
-    for b in valid_bottles:
-        brand_map.setdefault(b['brand'].lower(), []).append(b)
-
-    all_bundles = []
-    for brand, group_bottles in brand_map.items():
-        for b1, b2 in itertools.combinations(group_bottles, 2):
-            bundle_name = f"{b1['name']} & {b2['name']}"
-            if bundle_name in existing_bundles:
-                continue
-            combined_price = (b1['price'] + b2['price']) - 5
-            price_rounded = round_to_99(combined_price)
-
-            all_bundles.append({
-                'name': bundle_name,
-                'price': price_rounded,
-                'bottles': [b1, b2]
-            })
-
-    # 3) Cross-brand combos (price difference <= $10)
-    for b1, b2 in itertools.combinations(valid_bottles, 2):
-        if b1['brand'].lower() == b2['brand'].lower():
-            continue
-        price_diff = abs(b1['price'] - b2['price'])
-        if price_diff <= 10:
-            bundle_name = f"{b1['name']} & {b2['name']}"
-            if bundle_name in existing_bundles:
-                continue
-            combined_price = (b1['price'] + b2['price']) - 5
-            price_rounded = round_to_99(combined_price)
-
-            all_bundles.append({
-                'name': bundle_name,
-                'price': price_rounded,
-                'bottles': [b1, b2]
-            })
-
-    # 4) Sort by price descending
-    all_bundles.sort(key=lambda b: b['price'], reverse=True)
-
-    # 5) Keep only top N bundles
-    limited_bundles = all_bundles[:max_bundles]
-
-    print(f"[i] After filtering volumes (750ml or 1.5L), we found {len(valid_bottles)} bottles.")
-    print(f"[i] Generated {len(all_bundles)} combos, returning top {len(limited_bundles)} bundles.")
+    # 2-3) Stream candidate pairs (same-brand first, then cross-brand <= $10
+    #      diff) and keep the top N by price; ties keep generation order
+    seen = [0]
+    if k == 3:
+        top = _top_triples(valid, existing_bundles, max_bundles, seen)
+    else:
+        top = _top_pairs(valid, existing_bundles, max_bundles, seen)
+
+    # 4) Build full bundle dicts for the survivors only
+    limited_bundles = [
+        {'name': " & ".join(valid.names[i] for i in idx), 'price': price,
+         'bottles': [valid[i] for i in idx]}
+        for price, *idx in top
+    ]
+
+    print(f"[i] After filtering volumes (750ml or 1.5L), we found {len(valid)} bottles.")
+    print(f"[i] Generated {seen[0]} combos, returning top {len(limited_bundles)} bundles.")
     return limited_bundles
-def extract_volume(bottle_name: str) -> int:
+def _top_pairs(valid: Catalog, existing_bundles: set, max_bundles: int,
+               seen: list) -> list[tuple[float, int, int]]:
     """
-    Return bottle volume in millilitres:
-
-    • '750 ml' or implicit/blank  →  750  
-    • '1.5 L'                     → 1500  
-    • '1.75 L'                    → 1750  
-    • Anything else               → 0
+    (price_rounded, i, j) of the 'max_bundles' best rule-passing pairs not
+    in 'existing_bundles', best first. seen[0] counts every pair that
+    passed those filters.
     """
-    text = bottle_name.lower()
-
-    # explicit patterns first
-    pattern = re.compile(r'(\d+(?:\.\d+)?)\s*(ml|l)')
-    m = pattern.search(text)
-    if m:
-        vol_str, unit = m.groups()
-        vol = float(vol_str)
-        return int(vol) if unit == 'ml' else int(vol * 1000)
-
-    # no explicit volume found  →  assume standard 750 ml
-    return 750
+    if max_bundles <= 0:
+        return []
+    n = len(valid)
+    existing = valid.pair_codes(existing_bundles)
+
+    best_p = np.empty(0, dtype=np.float64)
+    best_seq = np.empty(0, dtype=np.int64)
+    best_i = best_j = np.empty(0, dtype=np.int64)
+    offset = 0
+    chunks = itertools.chain(same_brand_pair_chunks(valid.brand),
+                             cross_brand_pair_chunks(valid.price, valid.brand, max_diff=10))
+    for i, j in chunks:
+        seq = np.arange(offset, offset + i.size, dtype=np.int64)
+        offset += i.size
+        keep = ~np.isin(i * n + j, existing) if existing.size else np.ones(i.size, dtype=bool)
+        seen[0] += int(keep.sum())
+
+        price = _round_to_99_array((valid.price[i[keep]] + valid.price[j[keep]]) - 5)
+        best_p = np.concatenate([best_p, price])
+        best_seq = np.concatenate([best_seq, seq[keep]])
+        best_i = np.concatenate([best_i, i[keep]])
+        best_j = np.concatenate([best_j, j[keep]])
+        order = np.lexsort((best_seq, -best_p))[:max_bundles]   # price ↓, then stream order
+        best_p, best_seq, best_i, best_j = best_p[order], best_seq[order], best_i[order], best_j[order]
+
+    return list(zip(best_p.tolist(), best_i.tolist(), best_j.tolist()))
+def _top_triples(valid: Catalog, existing_bundles: set, max_bundles: int, seen: list,
+                 max_diff: float = 10) -> list[tuple]:
+    """
+    (price_rounded, i, j, k) of the 'max_bundles' best 3-bottle sets, best
+    first; i < j < k are catalog rows, so names keep catalog order.
+
+    Branch and bound over bottles sorted by price (high → low): a set is
+    grown one bottle at a time, and every partial set is bounded by adding
+    the next-dearest bottles still reachable. Once the heap holds N sets,
+    any branch whose bound can't beat the worst of them is cut – and as
+    bounds only fall further down the sorted list, the whole loop level
+    stops there. Ties go to the set found first (dearest bottles first).
+    seen[0] counts the complete sets that were actually evaluated.
+    """
+    if max_bundles <= 0 or len(valid) < 3:
+        return []
+    order = np.argsort(-valid.price, kind="stable")
+    price = valid.price[order].tolist()
+    brand = valid.brand[order].tolist()
+    rows = order.tolist()
+    n = len(rows)
+    existing = set(existing_bundles)
+
+    # where the price band of each bottle ends in the sorted list
+    neg = -valid.price[order]
+    ends = np.searchsorted(neg, neg + max_diff, side="right").tolist()
+
+    by_brand: dict[int, list[int]] = {}
+    for pos in range(n):
+        by_brand.setdefault(brand[pos], []).append(pos)
+
+    def partners(a: int, start: int) -> list[int]:
+        """Positions >= start that may join a: inside its $10 band, or its brand."""
+        band = list(range(start, max(start, ends[a])))
+        own = [p for p in by_brand.get(brand[a], ()) if p >= ends[a] and p >= start]
+        return band + own                       # both ascending, band first
+
+    def fits(x: int, y: int) -> bool:
+        return brand[x] == brand[y] or abs(price[x] - price[y]) <= max_diff
+
+    heap: list = []                             # (price, (-a, -b, -c)), worst on top
+
+    def beaten(raw: float) -> bool:
+        # tiny slack: the bound adds prices in another order than the sets do
+        return len(heap) == max_bundles and round_to_99(raw - 5 + 1e-9) <= heap[0][0]
+
+    for a in range(n - 2):
+        if beaten(price[a] + price[a + 1] + price[a + 2]):
+            break
+        bs = partners(a, a + 1)
+        for bi, b in enumerate(bs):
+            if bi + 1 == len(bs) or beaten(price[a] + price[b] + price[bs[bi + 1]]):
+                break
+            for c in bs[bi + 1:]:
+                if beaten(price[a] + price[b] + price[c]):
+                    break
+                if not fits(b, c):
+                    continue
+                ids = sorted((rows[a], rows[b], rows[c]))
+                if " & ".join(valid.names[i] for i in ids) in existing:
+                    continue
+                seen[0] += 1
+                p = round_to_99(sum(valid.price[i] for i in ids).item() - 5)
+                if len(heap) == max_bundles and p <= heap[0][0]:
+                    continue
+                if len(heap) < max_bundles:
+                    heapq.heappush(heap, (p, (-a, -b, -c)))
+                else:
+                    heapq.heapreplace(heap, (p, (-a, -b, -c)))
+
+    best = sorted(heap, reverse=True)           # price ↓, then first found
+    return [(p, *sorted(rows[-x] for x in key)) for p, key in best]
+def _round_to_99_array(prices: np.ndarray) -> np.ndarray:
+    """round_to_99 over an array; identical floats (one conversion per distinct dollar)."""
+    ipart = np.floor(prices)
+    ipart += (prices - ipart) >= 0.99
+    dollars, inverse = np.unique(ipart.astype(np.int64), return_inverse=True)
+    return np.array([float(f"{d}.99") for d in dollars.tolist()], dtype=np.float64)[inverse]
 def round_to_99(price: float) -> float:
     """
     Takes a float price and rounds up/down so it ends in .99
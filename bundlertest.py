@@ -3,26 +3,64 @@
 # Build + rank liquor-bottle bundles, using GPT to score synergy.
 # ---------------------------------------------------------------
 
-import itertools, math, re, json, os, time
-from ai_matcher import score_pair        # ← your GPT 0-100 scorer
+import heapq, itertools, math, re, json, os
+import numpy as np
+import ai_matcher
+from ai_matcher import score_pairs      # ← your GPT 0-100 scorer (batched)
+from pair_engine import same_brand_pair_chunks, cross_brand_pair_chunks
+from rate_limiter import TokenBucket
+from sqlite_cache import SqliteCache, pair_key
+from metrics import count, observe, timer
+from prerank import local_scores, top_k, overlap
+from catalog import Catalog
 
 # ----------------------------------------------------------------
-# ❶  Simple on-disk cache so we don’t pay twice for the same pair
+# ❶  SQLite cache so we don’t pay twice for the same pair
+#     (A & B and B & A share one entry; model + prompt are in the key)
 # ----------------------------------------------------------------
-_CACHE_FILE = "ai_bundle_scores.json"
-if os.path.exists(_CACHE_FILE):
-    with open(_CACHE_FILE, "r", encoding="utf-8") as f:
-        _SCORE_CACHE: dict[str, float] = json.load(f)
-else:
-    _SCORE_CACHE = {}
+_CACHE_DB       = os.getenv("SCORE_CACHE_DB", "ai_bundle_scores.sqlite")
+_LEGACY_JSON    = "ai_bundle_scores.json"
+_CACHE_TTL_DAYS = float(os.getenv("SCORE_CACHE_TTL_DAYS", "0"))        # 0 = never expire
+_CACHE_MAX      = int(os.getenv("SCORE_CACHE_MAX_ENTRIES", "0"))       # 0 = unbounded
+
+_new_db = not os.path.exists(_CACHE_DB)
+_SCORE_CACHE = SqliteCache(
+    _CACHE_DB,
+    namespace=f"score:{ai_matcher.MODEL}:{ai_matcher.PROMPT_VERSION}",
+    ttl=_CACHE_TTL_DAYS * 86400 or None,
+    max_entries=_CACHE_MAX or None,
+)
+if _new_db and os.path.exists(_LEGACY_JSON):
+    # one-off import of the old "A||B" JSON cache
+    with open(_LEGACY_JSON, "r", encoding="utf-8") as f:
+        _SCORE_CACHE.set_many({
+            pair_key(*k.split("||", 1)): v
+            for k, v in json.load(f).items() if "||" in k
+        })
+
+# batching, concurrency + rate limits for AI scoring
+AI_BATCH_SIZE       = int(os.getenv("AI_BATCH_SIZE", "20"))
+AI_CONCURRENCY      = int(os.getenv("AI_CONCURRENCY", "8"))
+AI_REQUESTS_PER_MIN = float(os.getenv("AI_REQUESTS_PER_MIN", "500"))
+AI_TOKENS_PER_MIN   = float(os.getenv("AI_TOKENS_PER_MIN", "200000"))
+_SCORE_CHUNK        = 256          # candidates pulled from the stream per scoring round
+# local pre-rank: only the best K candidates are sent to the LLM (0 = score all);
+# AUDIT also scores everything and reports how much of the top N survived
+AI_PRERANK_K        = int(os.getenv("AI_PRERANK_K", "200"))
+AI_PRERANK_AUDIT    = os.getenv("AI_PRERANK_AUDIT", "") not in ("", "0")
 
 # ----------------------------------------------------------------
 # ❷  Public function: generate_bundles
 # ----------------------------------------------------------------
 def generate_bundles(
-    bottles: list[dict],
+    bottles: list[dict] | Catalog,
     existing_bundles: set,
-    max_bundles: int = 10
+    max_bundles: int = 10,
+    concurrency: int | None = None,
+    batch_size: int | None = None,
+    only_with: set | None = None,
+    prerank_k: int | None = None,
+    audit: bool | None = None
 ) -> list[dict]:
     """
     Return up to `max_bundles` high-quality bundles.
@@ -31,75 +69,176 @@ def generate_bundles(
     • Same-brand pairs first, then cross-brand pairs (≤ $10 price diff)
     • Price = (sum − $5) → rounded to .99
     • AI ranks bundles (0-100), then we keep the top `max_bundles`
+    • uncached pairs are scored `batch_size` per request (AI_BATCH_SIZE),
+      with up to `concurrency` requests in flight (AI_CONCURRENCY),
+      all under one rate limiter
+    • `only_with` (bottle names) limits *paid* scoring to pairs that contain
+      at least one of them – e.g. the new/changed bottles of a catalog diff.
+      Pairs of unchanged bottles still compete for the top N with their
+      cached scores; only pairs that were never scored are left out
+    • a local NumPy pre-rank keeps only the best `prerank_k` candidates
+      (AI_PRERANK_K; 0 = off) for AI scoring; `audit` (AI_PRERANK_AUDIT)
+      also scores every candidate and reports the top-N overlap
     """
 
-    # 1) size filter -------------------------------------------------
-    valid = [
-        b for b in bottles
-        if (v := extract_volume(b["name"]) or extract_volume(b["brand"]))
-           in (750, 1500, 1750)
-    ]
-    if not valid:
+    # 1) size filter (catalog columns are parsed once) ----------------
+    catalog = Catalog.from_bottles(bottles)
+    valid = catalog.where(np.isin(catalog.volume, (750, 1500, 1750)))
+    if not len(valid):
         print("[!] No valid bottles (750 ml | 1.5 L | 1.75 L).")
         return []
 
-    # 2) generate candidate bundles ---------------------------------
-    brand_map: dict[str, list] = {}
-    for b in valid:
-        brand_map.setdefault(b["brand"].lower(), []).append(b)
+    # 2) candidate pairs as index arrays ------------------------------
+    n_combos = [0]
+    chunks = _pair_chunks(valid, existing_bundles, n_combos, only_with)
 
-    combos: list[dict] = []
+    # 3) optional local pre-rank: only the best K reach the LLM -------
+    #    (ranked on the index arrays; names are built for survivors only)
+    k = AI_PRERANK_K if prerank_k is None else prerank_k
+    audit = AI_PRERANK_AUDIT if audit is None else audit
+    full = None
+    if k:
+        i, j = _prerank(valid, chunks, k)
+        if n_combos[0] > i.size:
+            # the audit re-streams every pair rather than holding them all
+            full = _pair_chunks(valid, existing_bundles, [0], only_with) if audit else None
+            print(f"[i] pre-rank: {n_combos[0]} combos → top {i.size} sent to AI.")
+        candidates = _combos(valid, i, j)
+    else:
+        candidates = itertools.chain.from_iterable(_combos(valid, i, j) for i, j in chunks)
 
-    # 2-A same-brand
-    for group in brand_map.values():
-        for b1, b2 in itertools.combinations(group, 2):
-            _add_combo(b1, b2, combos, existing_bundles)
+    # 3b) incremental runs: unchanged-only pairs cost nothing extra –
+    #     they compete with whatever score the cache already holds
+    cached = ()
+    if only_with is not None:
+        rest = _pair_chunks(valid, existing_bundles, n_combos, only_with, touching=False)
+        cached = _cached_scored(itertools.chain.from_iterable(_combos(valid, i, j) for i, j in rest))
 
-    # 2-B cross-brand (price diff ≤ $10)
-    for b1, b2 in itertools.combinations(valid, 2):
-        if b1["brand"].lower() == b2["brand"].lower():
-            continue
-        if abs(b1["price"] - b2["price"]) <= 10:
-            _add_combo(b1, b2, combos, existing_bundles)
-
-    if not combos:
+    # 4) AI score each combo (with caching) as it streams past, keeping
+    #    the top N by (ai_score ↓ , price ↓) in a bounded heap ---------
+    #    (scores are written to the cache as they arrive; nothing to flush)
+    score_args = dict(
+        batch_size=AI_BATCH_SIZE if batch_size is None else batch_size,
+        workers=AI_CONCURRENCY if concurrency is None else concurrency,
+        limiter=TokenBucket(AI_REQUESTS_PER_MIN, AI_TOKENS_PER_MIN),
+    )
+    best = _top_scored(candidates, max_bundles, cached=cached, **score_args)
+    if full is not None:
+        reference = _top_scored(itertools.chain.from_iterable(_combos(valid, i, j) for i, j in full),
+                                max_bundles, **score_args)
+        share = overlap([s[2] for s in best], [s[2] for s in reference])
+        observe("prerank.overlap", share)
+        print(f"[i] pre-rank audit: {share:.0%} of the full-scoring top {len(reference)} kept.")
+    _SCORE_CACHE.evict()
+    if not n_combos[0]:
         print("[!] No combos generated after rules.")
         return []
 
-    # 3) AI score every combo (with caching) -------------------------
-    for c in combos:
-        key = f'{c["bottles"][0]["name"]}||{c["bottles"][1]["name"]}'
-        if key not in _SCORE_CACHE:
-            try:
-                _SCORE_CACHE[key] = score_pair(*c["bottles"])
-                time.sleep(0.3)  # gentle on rate limit
-            except Exception as e:
-                print(f"[AI] score error → {e}")
-                _SCORE_CACHE[key] = 50.0  # neutral
-        c["ai_score"] = _SCORE_CACHE[key]
-
-    # persist cache
-    with open(_CACHE_FILE, "w", encoding="utf-8") as f:
-        json.dump(_SCORE_CACHE, f, ensure_ascii=False, indent=2)
-
-    # 4) sort by (ai_score ↓ , price ↓) and keep top N --------------
-    combos.sort(key=lambda x: (x["ai_score"], x["price"]), reverse=True)
-    top = combos[:max_bundles]
+    top = [
+        {"name": name, "price": price, "bottles": [b1, b2], "ai_score": score}
+        for score, price, name, b1, b2 in best
+    ]
 
     # 5) reporting ---------------------------------------------------
-    print(f"[i] {len(valid)} size-valid bottles → {len(combos)} combos "
+    print(f"[i] {len(valid)} size-valid bottles → {n_combos[0]} combos "
           f"→ returning top {len(top)} bundles.")
     return top
 
 # ----------------------------------------------------------------
 # ❸  helpers
 # ----------------------------------------------------------------
-def _add_combo(b1, b2, sink, existing):
-    name = f"{b1['name']} & {b2['name']}"
-    if name in existing:
-        return
-    price = round_to_99((b1["price"] + b2["price"]) - 5)
-    sink.append({"name": name, "price": price, "bottles": [b1, b2]})
+def _pair_chunks(valid, existing, counter, only_with=None, touching=True):
+    """
+    Yield (i, j) index arrays into `valid` for same-brand pairs first,
+    then cross-brand pairs (≤ $10 price diff), minus pairs already in
+    `existing` and – if given – pairs without a bottle from `only_with`
+    (touching=False: the complement, pairs of untouched bottles only).
+    counter[0] tracks the total.
+    """
+    n = len(valid)
+    done = valid.pair_codes(existing)
+    touched = valid.mask_names(only_with) if only_with is not None else None
+    chunks = itertools.chain(
+        same_brand_pair_chunks(valid.brand),                                 # 2-A same-brand
+        cross_brand_pair_chunks(valid.price, valid.brand, max_diff=10),      # 2-B cross-brand
+    )
+    for i, j in chunks:
+        keep = ~np.isin(i * n + j, done) if done.size else np.ones(i.size, dtype=bool)
+        if touched is not None:
+            hit = touched[i] | touched[j]
+            keep &= hit if touching else ~hit
+        counter[0] += int(keep.sum())
+        yield i[keep], j[keep]
+
+def _combos(valid, i, j):
+    """Yield (name, price, b1, b2) for index arrays i, j."""
+    names = valid.names
+    for a, b in zip(i.tolist(), j.tolist()):
+        b1, b2 = valid[a], valid[b]
+        yield f"{names[a]} & {names[b]}", round_to_99((b1["price"] + b2["price"]) - 5), b1, b2
+
+def _prerank(valid, chunks, k):
+    """
+    Keep the k pairs with the best local score, in stream order. Each
+    chunk is merged into a running top k, so at most k + one chunk of
+    pairs is held at a time.
+    """
+    feats = valid.features()
+    i = j = np.empty(0, dtype=np.int64)
+    s = np.empty(0, dtype=np.float64)
+    seen = 0
+    with timer("prerank"):
+        for ci, cj in chunks:
+            seen += ci.size
+            i, j = np.concatenate((i, ci)), np.concatenate((j, cj))
+            s = np.concatenate((s, local_scores(feats, ci, cj)))
+            if s.size > k:
+                keep = top_k(s, k)
+                i, j, s = i[keep], j[keep], s[keep]
+    count("prerank.dropped", seen - i.size)
+    return i, j
+
+def _top_scored(candidates, max_bundles, batch_size, workers, limiter, cached=()):
+    scored = itertools.chain(_scored_batched(candidates, batch_size, workers, limiter), cached)
+    return heapq.nlargest(max_bundles, scored, key=lambda s: (s[0], s[1]))
+
+def _cached_scored(candidates):
+    """(score, price, name, b1, b2) for the candidates the cache already scored – no API calls."""
+    while chunk := list(itertools.islice(candidates, _SCORE_CHUNK)):
+        keys = [pair_key(b1["name"], b2["name"]) for _, _, b1, b2 in chunk]
+        scores = _SCORE_CACHE.get_many(keys)
+        count("score_cache.hit", sum(key in scores for key in keys))
+        for key, (name, price, b1, b2) in zip(keys, chunk):
+            if key in scores:
+                yield scores[key], price, name, b1, b2
+
+def _scored_batched(candidates, batch_size, workers, limiter):
+    """
+    Pull candidates in chunks, score the uncached pairs of each chunk in
+    batched requests, then yield (score, price, name, b1, b2) in stream order.
+    """
+    chunk_size = max(_SCORE_CHUNK, batch_size * workers)
+    while chunk := list(itertools.islice(candidates, chunk_size)):
+        keys = [pair_key(b1["name"], b2["name"]) for _, _, b1, b2 in chunk]
+        scores = _SCORE_CACHE.get_many(keys)
+        todo: dict[str, tuple] = {}
+        for key, (_, _, b1, b2) in zip(keys, chunk):
+            if key not in scores:
+                todo.setdefault(key, (b1, b2))
+        count("score_cache.hit", len(chunk) - len(todo))
+        count("score_cache.miss", len(todo))
+        if todo:
+            todo_keys = list(todo)
+
+            def store(idx, score):
+                scores[todo_keys[idx]] = score
+                _SCORE_CACHE[todo_keys[idx]] = score
+
+            with timer("score_pairs"):
+                score_pairs(list(todo.values()), batch_size=batch_size,
+                            max_workers=workers, limiter=limiter, on_result=store)
+        for key, (name, price, b1, b2) in zip(keys, chunk):
+            yield scores[key], price, name, b1, b2
 def extract_volume(text: str) -> int:
     """
     Parse formats like:
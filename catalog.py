@@ -0,0 +1,138 @@
+# catalog.py
+# ---------------------------------------------------------------
+# Columnar bottle catalog, built once from the scraper's dicts.
+#  • brands interned to small ints (lower-cased once, not per pair)
+#  • float64 prices, parsed volumes and expression codes as arrays
+#  • the original dicts are kept alongside for output (bundle dicts,
+#    CSV export) – nothing downstream has to change shape
+# Bundling, pre-ranking and scoring read the arrays; per-pair work is
+# integer/float compares instead of re-parsing strings.
+# ---------------------------------------------------------------
+
+import re
+from functools import lru_cache
+
+import numpy as np
+
+from prerank import expression
+
+_VOLUME_RE = re.compile(r'(\d+(?:\.\d+)?)\s*(ml|l)')
+
+
+@lru_cache(maxsize=65536)
+def extract_volume(bottle_name: str) -> int:
+    """
+    Return bottle volume in millilitres:
+
+    • '750 ml' or implicit/blank  →  750
+    • '1.5 L'                     → 1500
+    • '1.75 L'                    → 1750
+    • Anything else               → 0
+    """
+    # explicit patterns first
+    m = _VOLUME_RE.search(bottle_name.lower())
+    if m:
+        vol_str, unit = m.groups()
+        vol = float(vol_str)
+        return int(vol) if unit == 'ml' else int(vol * 1000)
+
+    # no explicit volume found  →  assume standard 750 ml
+    return 750
+
+
+class Catalog:
+    """
+    cat = Catalog.from_bottles(scraped)
+    cat.price[i], cat.brand[i], cat.volume[i], cat.bottles[i]
+    sub = cat.where(np.isin(cat.volume, (750, 1500)))
+    """
+
+    def __init__(self, bottles: list[dict], names: list[str], brand: np.ndarray,
+                 brand_names: list[str], price: np.ndarray, volume: np.ndarray):
+        self.bottles = bottles
+        self.names = names
+        self.brand = brand                  # int64 ids into brand_names
+        self.brand_names = brand_names      # lower-cased, first-appearance order
+        self.price = price
+        self.volume = volume
+        self._expr: np.ndarray | None = None
+
+    @classmethod
+    def from_bottles(cls, bottles) -> "Catalog":
+        if isinstance(bottles, Catalog):
+            return bottles
+        bottles = list(bottles)
+        n = len(bottles)
+        ids: dict[str, int] = {}
+        brand = np.fromiter((ids.setdefault(b['brand'].lower(), len(ids)) for b in bottles),
+                            dtype=np.int64, count=n)
+        return cls(
+            bottles,
+            [b['name'] for b in bottles],
+            brand,
+            list(ids),
+            np.fromiter((b['price'] for b in bottles), dtype=np.float64, count=n),
+            np.fromiter((extract_volume(b['name']) or extract_volume(b['brand']) for b in bottles),
+                        dtype=np.int64, count=n),
+        )
+
+    def __len__(self) -> int:
+        return len(self.bottles)
+
+    def __getitem__(self, i: int) -> dict:
+        return self.bottles[i]
+
+    def __iter__(self):
+        return iter(self.bottles)
+
+    def take(self, idx) -> "Catalog":
+        """Sub-catalog of rows `idx` (brand ids are kept, not renumbered)."""
+        idx = np.asarray(idx, dtype=np.int64)
+        sub = Catalog(
+            [self.bottles[i] for i in idx.tolist()],
+            [self.names[i] for i in idx.tolist()],
+            self.brand[idx], self.brand_names, self.price[idx], self.volume[idx],
+        )
+        if self._expr is not None:
+            sub._expr = self._expr[idx]
+        return sub
+
+    def where(self, mask: np.ndarray) -> "Catalog":
+        return self.take(np.flatnonzero(mask))
+
+    @property
+    def expr(self) -> np.ndarray:
+        """Expression code per bottle (see prerank.expression), parsed on first use."""
+        if self._expr is None:
+            self._expr = np.fromiter((expression(n) for n in self.names),
+                                     dtype=np.int8, count=len(self.names))
+        return self._expr
+
+    def features(self) -> dict[str, np.ndarray]:
+        """The per-bottle arrays prerank.local_scores() expects."""
+        return {"brand": self.brand, "price": self.price, "volume": self.volume, "expr": self.expr}
+
+    def mask_names(self, names) -> np.ndarray:
+        """Boolean array: bottle name is in `names`."""
+        names = names if isinstance(names, (set, frozenset, dict)) else set(names)
+        return np.fromiter((n in names for n in self.names), dtype=bool, count=len(self.names))
+
+    def pair_codes(self, bundle_names) -> np.ndarray:
+        """
+        Encode "<name i> & <name j>" bundle names (i < j) as i * len + j,
+        for vectorised membership tests against candidate pairs. Names
+        that don't split into two catalog bottles are ignored.
+        """
+        rows: dict[str, list[int]] = {}
+        for i, name in enumerate(self.names):
+            rows.setdefault(name, []).append(i)
+        n = len(self.names)
+        codes = []
+        for bundle in bundle_names:
+            cut = bundle.find(" & ")
+            while cut != -1:                    # a name may itself contain " & "
+                left, right = bundle[:cut], bundle[cut + 3:]
+                if left in rows and right in rows:
+                    codes.extend(i * n + j for i in rows[left] for j in rows[right] if i < j)
+                cut = bundle.find(" & ", cut + 1)
+        return np.unique(np.array(codes, dtype=np.int64))
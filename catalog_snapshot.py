@@ -0,0 +1,116 @@
+# catalog_snapshot.py
+# ---------------------------------------------------------------
+# What the category looked like last run, so this run only pays for
+# what changed.
+#  • keyed by product identity (brand + name)
+#  • stores price, image URL, local image path and a content hash
+#  • diff() splits a fresh scrape into new / changed / unchanged / removed
+#  • written atomically once the run has finished with it
+# ---------------------------------------------------------------
+
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+
+DEFAULT_SNAPSHOT = "catalog_snapshot.json"
+_SEP = "\x1f"
+
+
+def product_key(product: dict) -> str:
+    return f"{product['brand'].lower()}{_SEP}{product['name'].lower()}"
+
+
+def content_hash(product: dict) -> str:
+    """Hash of everything that changes a bundle built from this product."""
+    raw = f"{product['name']}{_SEP}{product['brand']}{_SEP}{product['price']:.2f}{_SEP}{product.get('image_url', '')}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CatalogDiff:
+    new: list[dict] = field(default_factory=list)
+    changed: list[dict] = field(default_factory=list)
+    unchanged: list[dict] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)      # product keys
+
+    @property
+    def touched(self) -> set[str]:
+        """Names of new or changed bottles – the ones that need work."""
+        return {p["name"] for p in self.new} | {p["name"] for p in self.changed}
+
+    def summary(self) -> str:
+        return (f"{len(self.new)} new, {len(self.changed)} changed, "
+                f"{len(self.unchanged)} unchanged, {len(self.removed)} removed")
+
+
+class CatalogSnapshot:
+    """
+    snap = CatalogSnapshot("catalog_snapshot.json")
+    diff = snap.diff(products)        # compare with last run
+    ...
+    snap.update(products); snap.save()
+    """
+
+    def __init__(self, path: str = DEFAULT_SNAPSHOT):
+        self.path = path
+        self.entries: dict[str, dict] = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"[!] ignoring unreadable snapshot {path}: {e}")
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, product: dict) -> dict | None:
+        return self.entries.get(product_key(product))
+
+    def cached_image(self, product: dict) -> str | None:
+        """
+        Local image path from last run if the product's image URL is the
+        same and the file is still there; None means it must be downloaded.
+        """
+        entry = self.get(product)
+        if (entry and entry.get("image_url") == product.get("image_url")
+                and entry.get("image_path") and os.path.exists(entry["image_path"])):
+            return entry["image_path"]
+        return None
+
+    def diff(self, products: list[dict]) -> CatalogDiff:
+        d = CatalogDiff()
+        seen = set()
+        for p in products:
+            key = product_key(p)
+            seen.add(key)
+            entry = self.entries.get(key)
+            if entry is None:
+                d.new.append(p)
+            elif entry.get("hash") != content_hash(p):
+                d.changed.append(p)
+            else:
+                d.unchanged.append(p)
+        d.removed = [k for k in self.entries if k not in seen]
+        return d
+
+    def update(self, products: list[dict]):
+        """Replace the snapshot with this scrape (removed products drop out)."""
+        self.entries = {
+            product_key(p): {
+                "name": p["name"],
+                "brand": p["brand"],
+                "price": p["price"],
+                "image_url": p.get("image_url", ""),
+                "image_path": p.get("image_path", ""),
+                "hash": content_hash(p),
+            }
+            for p in products
+        }
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
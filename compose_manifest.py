@@ -0,0 +1,82 @@
+# compose_manifest.py
+# ---------------------------------------------------------------
+# Which bundle images are already on disk, and what they were made from.
+#  • keyed by the bundle's primary output path
+#  • each entry: hash of the input images (bytes, in layout order) +
+#    composer settings, and every file that render produced
+#  • fresh() → the same inputs and settings made all those files, and
+#    they still exist – the bundle can be skipped entirely
+#  • written atomically, like the catalog snapshot
+# ---------------------------------------------------------------
+
+import hashlib
+import json
+import os
+import threading
+
+from metrics import count
+
+DEFAULT_MANIFEST = "bundle_images/manifest.json"
+
+
+class ComposeManifest:
+    """
+    man = ComposeManifest("bundle_images/manifest.json")
+    key = man.key(image_paths, composer.settings_key())
+    if not man.fresh(out_path, key): … compose …; man.record(out_path, key, outputs)
+    man.save()
+    """
+
+    def __init__(self, path: str = DEFAULT_MANIFEST):
+        self.path = path
+        self.entries: dict[str, dict] = {}
+        self._hashes: dict[tuple, str] = {}     # (path, size, mtime) → sha256
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"[!] ignoring unreadable compose manifest {path}: {e}")
+
+    def __len__(self):
+        return len(self.entries)
+
+    def file_hash(self, path: str) -> str:
+        """sha256 of a source image, re-read only when its size or mtime changes."""
+        st = os.stat(path)
+        stamp = (path, st.st_size, st.st_mtime_ns)
+        digest = self._hashes.get(stamp)
+        if digest is None:
+            with open(path, "rb") as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+            self._hashes[stamp] = digest
+        return digest
+
+    def key(self, image_paths: list[str], settings: str) -> str:
+        """Fingerprint of one render: input bytes (order matters) + settings."""
+        h = hashlib.sha256(settings.encode("utf-8"))
+        for path in image_paths:
+            h.update(self.file_hash(path).encode("ascii"))
+        return h.hexdigest()
+
+    def fresh(self, output_path: str, key: str) -> bool:
+        with self._lock:
+            entry = self.entries.get(output_path)
+        ok = (entry is not None and entry["key"] == key
+              and all(os.path.exists(p) for p in entry["outputs"]))
+        count("compose_manifest.hit" if ok else "compose_manifest.miss")
+        return ok
+
+    def record(self, output_path: str, key: str, outputs: list[str]):
+        with self._lock:
+            self.entries[output_path] = {"key": key, "outputs": list(outputs)}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._lock:
+            data = json.dumps(self.entries, ensure_ascii=False)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp, self.path)
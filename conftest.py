@@ -0,0 +1,4 @@
+# conftest.py
+# test_scrape.py is a manual script that scrapes the live site on import –
+# keep it out of pytest collection.
+collect_ignore = ["test_scrape.py"]
@@ -1,6 +1,9 @@
 # csv_exporter.py
-import csv, os, re
+import csv, gzip, os, re
 from category_utils import get_product_category
+from metrics import timed
+
+SHOPIFY_MAX_BYTES = 15 * 1024 * 1024     # Shopify's product-CSV import limit (15 MB)
 
 def _handle(text: str) -> str:
     """Shopify handle (lowercase, hyphens, ascii)."""
@@ -36,61 +39,158 @@ SHOPIFY_HEADERS = [
 ]
 
 # --- bundle-dict → shopify-row -----------------------------------
+# Columns that are the same for every bundle, filled in once.
+_STATIC_FIELDS = {
+    'Vendor':        'Bottle Buzz',
+    'Type':          'Bundle',
+    'Published':     'TRUE',
+    'Option1 Name':  'Title',
+    'Option1 Value': 'Default Title',
+    'Variant Grams': 1361,
+    'Variant Inventory Tracker':   'shopify',
+    'Variant Inventory Qty':       10,
+    'Variant Inventory Policy':    'deny',
+    'Variant Fulfillment Service': 'manual',
+    'Variant Requires Shipping':   'TRUE',
+    'Variant Taxable': 'TRUE',
+    'Image Position':  1,
+    'Gift Card':       'FALSE',
+    'Google Shopping / Age Group': 'adult',
+    'Google Shopping / Condition': 'new',
+    'Google Shopping / Custom Label 0': 'Bundle',
+    'Variant Weight Unit': 'g',
+    'Status': 'draft',
+}
+_TEMPLATE_ROW = [_STATIC_FIELDS.get(h, '') for h in SHOPIFY_HEADERS]
+
+# positions of the per-bundle columns
+(_HANDLE, _TITLE, _BODY, _CATEGORY, _TAGS, _SKU, _PRICE, _IMAGE, _ALT,
+ _SEO_TITLE, _SEO_DESC, _GOOGLE_CATEGORY) = (SHOPIFY_HEADERS.index(h) for h in (
+    'Handle', 'Title', 'Body (HTML)', 'Product Category', 'Tags', 'Variant SKU',
+    'Variant Price', 'Image Src', 'Image Alt Text', 'SEO Title', 'SEO Description',
+    'Google Shopping / Google Product Category'))
+
+def _row_values(bundle: dict) -> list:
+    """Row as a list in SHOPIFY_HEADERS order: template copy + per-bundle fields."""
+    row = _TEMPLATE_ROW.copy()
+    name = bundle['name']
+    category = get_product_category(bundle.get('category', ''))
+
+    row[_HANDLE]    = _handle(name)
+    row[_TITLE]     = name
+    row[_BODY]      = bundle.get('description', '')
+    row[_CATEGORY]  = category
+    row[_TAGS]      = bundle.get('tags', 'Bundles, Liquor')
+    row[_SKU]       = bundle.get('sku', '')
+    row[_PRICE]     = f"{bundle['price']:.2f}"
+    row[_IMAGE]     = bundle.get('image_src', '')
+    row[_ALT]       = name
+    row[_SEO_TITLE] = f"Buy {name} Online | Bottle Buzz"
+    row[_SEO_DESC]  = f"Shop {name} at the best price on Bottle Buzz."
+    row[_GOOGLE_CATEGORY] = category
+    return row
+
 def map_bundle_to_shopify_fields(bundle: dict) -> dict:
     """
     Convert a bundle produced by your pipeline into a fully-populated
     Shopify CSV row (matching SHOPIFY_HEADERS).
     """
-    row = {header: '' for header in SHOPIFY_HEADERS}
-
-    row['Handle']        = _handle(bundle['name'])
-    row['Title']         = bundle['name']
-    row['Body (HTML)']   = bundle.get('description', '')
-    row['Vendor']        = 'Bottle Buzz'
-    row['Product Category'] = get_product_category(bundle.get('category', ''))
-    row['Type']          = 'Bundle'
-    row['Tags']          = bundle.get('tags', 'Bundles, Liquor')
-    row['Published']     = 'TRUE'
-    row['Option1 Name']  = 'Title'
-    row['Option1 Value'] = 'Default Title'
-
-    # --- variant fields ---
-    row['Variant SKU']   = bundle.get('sku', '')
-    row['Variant Grams'] = 1361
-    row['Variant Inventory Tracker'] = 'shopify'
-    row['Variant Inventory Qty']     = 10
-    row['Variant Inventory Policy']  = 'deny'
-    row['Variant Fulfillment Service'] = 'manual'
-    row['Variant Price']   = f"{bundle['price']:.2f}"
-    row['Variant Requires Shipping'] = 'TRUE'
-    row['Variant Taxable'] = 'TRUE'
-
-    row['Image Src']      = bundle.get('image_src', '')
-    row['Image Position'] = 1
-    row['Image Alt Text'] = bundle['name']
-    row['Gift Card']      = 'FALSE'
-    row['SEO Title']      = f"Buy {bundle['name']} Online | Bottle Buzz"
-    row['SEO Description'] = f"Shop {bundle['name']} at the best price on Bottle Buzz."
-    row['Google Shopping / Google Product Category'] = row['Product Category']
-    row['Google Shopping / Age Group'] = 'adult'
-    row['Google Shopping / Condition'] = 'new'
-    row['Google Shopping / Custom Label 0'] = 'Bundle'
-    row['Variant Weight Unit'] = 'g'
-    row['Status'] = 'draft'
-
-    return row
+    return dict(zip(SHOPIFY_HEADERS, _row_values(bundle)))
 
 # -----------------------------------------------------------------
-def export_to_shopify_csv(bundles: list[dict], output_file='shopify_bundles.csv'):
+class _Line:
+    """csv.writer target that just keeps the last formatted row."""
+    text = ''
+    def write(self, s):
+        self.text = s
+
+class ShopifyCsvWriter:
     """
-    Write bundles to a fully-featured Shopify template CSV.
+    Incremental writer: header on open, one row per write(), so rows can
+    be produced while the rest of the pipeline is still running. Memory
+    stays flat however many bundles go through.
+
+    max_bytes: start a new part (name_part2.csv, …) before a file would
+               pass this size; every part gets its own header. Defaults
+               to Shopify's import limit; None disables splitting.
+    compress:  gzip each part (.csv.gz); max_bytes still applies to the
+               uncompressed CSV, which is what Shopify sees.
     """
-    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    def __init__(self, output_file='shopify_bundles.csv', max_bytes: int | None = SHOPIFY_MAX_BYTES,
+                 compress: bool = False):
+        os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+        if compress and not output_file.endswith('.gz'):
+            output_file += '.gz'
+        self.output_file = output_file
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.count = 0
+        self.files: list[str] = []
+        self._f = None
+        self._bytes = 0
+        self._rows_in_part = 0
+        self._line = _Line()
+        self._csv = csv.writer(self._line)
+        self._csv.writerow(SHOPIFY_HEADERS)
+        self._header = self._line.text.encode('utf-8')
+        self._open_part()
 
-    with open(output_file, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=SHOPIFY_HEADERS)
-        writer.writeheader()
-        for b in bundles:
-            writer.writerow(map_bundle_to_shopify_fields(b))
+    def _part_path(self, n: int) -> str:
+        if n == 1:
+            return self.output_file
+        base, ext = self.output_file, ''
+        for suffix in ('.gz', '.csv'):
+            if base.endswith(suffix):
+                base, ext = base[:-len(suffix)], suffix + ext
+        return f"{base}_part{n}{ext}"
+
+    def _open_part(self):
+        if self._f is not None:
+            self._f.close()
+        path = self._part_path(len(self.files) + 1)
+        self._f = gzip.open(path, 'wb') if self.compress else open(path, 'wb')
+        self.files.append(path)
+        self._f.write(self._header)
+        self._bytes = len(self._header)
+        self._rows_in_part = 0
+
+    @timed("export.write")
+    def write(self, bundle: dict):
+        self._csv.writerow(_row_values(bundle))
+        data = self._line.text.encode('utf-8')
+        if (self.max_bytes and self._rows_in_part
+                and self._bytes + len(data) > self.max_bytes):
+            self._open_part()
+        self._f.write(data)
+        self._bytes += len(data)
+        self._rows_in_part += 1
+        self.count += 1
+
+    def close(self):
+        if self._f is not None and not self._f.closed:
+            self._f.close()
+            if len(self.files) == 1:
+                print(f"[✔] Exported {self.count} bundles → {self.output_file}")
+            else:
+                print(f"[✔] Exported {self.count} bundles → {len(self.files)} files: "
+                      + ", ".join(self.files))
+
+    def __enter__(self):
+        return self
 
-    print(f"[✔] Exported {len(bundles)} bundles → {output_file}")
+    def __exit__(self, *exc):
+        self.close()
+
+@timed("export")
+def export_to_shopify_csv(bundles, output_file='shopify_bundles.csv',
+                          max_bytes: int | None = SHOPIFY_MAX_BYTES,
+                          compress: bool = False) -> list[str]:
+    """
+    Write bundles (any iterable – rows are streamed, never collected) to a
+    fully-featured Shopify template CSV, split at max_bytes.
+    Returns the files written.
+    """
+    with ShopifyCsvWriter(output_file, max_bytes=max_bytes, compress=compress) as writer:
+        for b in bundles:
+            writer.write(b)
+    return writer.files
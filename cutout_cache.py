@@ -0,0 +1,78 @@
+# cutout_cache.py
+# ---------------------------------------------------------------
+# Background-removed bottle cut-outs, cached by (source bytes, model).
+#  • in-memory LRU for the current run
+#  • RGBA PNGs on disk for later runs
+# One segmentation per unique bottle image, ever – not two per bundle.
+# ---------------------------------------------------------------
+
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+from metrics import count
+
+
+class CutoutCache:
+    def __init__(self, folder: str = "cutouts", model_name: str = "u2net",
+                 max_memory: int = 64):
+        self.folder = os.path.join(folder, model_name)
+        self.model_name = model_name
+        self.max_memory = max_memory
+        self.hits = self.misses = 0
+        self._lru: OrderedDict[str, Image.Image] = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(self.folder, exist_ok=True)
+
+    @staticmethod
+    def key(image_bytes: bytes) -> str:
+        return hashlib.sha256(image_bytes).hexdigest()
+
+    def _remember(self, key: str, img: Image.Image):
+        with self._lock:
+            self._lru[key] = img
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_memory:
+                self._lru.popitem(last=False)
+
+    def get_or_create(self, image_bytes: bytes, segment) -> Image.Image:
+        """
+        Return the RGBA cut-out for `image_bytes`, calling
+        segment(image_bytes) -> Image only on a cache miss.
+        The returned image is a copy and safe to modify.
+        """
+        key = self.key(image_bytes)
+        with self._lock:
+            img = self._lru.get(key)
+            if img is not None:
+                self._lru.move_to_end(key)
+                self.hits += 1
+                count("cutout_cache.hit")
+                return img.copy()
+
+        path = os.path.join(self.folder, key + ".png")
+        if os.path.exists(path):
+            try:
+                with Image.open(path) as f:
+                    img = f.convert("RGBA")
+                self.hits += 1
+                count("cutout_cache.hit")
+            except OSError:
+                img = None                      # truncated file – recompute
+
+        if img is None:
+            self.misses += 1
+            count("cutout_cache.miss")
+            img = segment(image_bytes).convert("RGBA")
+            buf = io.BytesIO()
+            img.save(buf, format="PNG")
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(buf.getvalue())
+            os.replace(tmp, path)
+
+        self._remember(key, img)
+        return img.copy()
@@ -1,25 +1,220 @@
 # description_builder.py
 
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
 import openai
+from rate_limiter import TokenBucket
+from sqlite_cache import SqliteCache
+from metrics import count, timed, timer
 
 # Make sure you've set openai.api_key = "YOUR_KEY" before usage
 
-def generate_description(bundle_name: str) -> str:
-    """
-    For a simple example, we'll do minimal prompt to GPT.
-    In reality, you can pass brand, flavor notes, etc.
-    """
-    prompt = (
+MODEL          = "gpt-3.5-turbo"
+PROMPT_VERSION = "desc-v1"      # bump when the prompt changes (invalidates the cache)
+FRAGMENT_PROMPT_VERSION = "frag-v1"
+
+# "bundle"    – one GPT call per bundle name (original behaviour)
+# "fragments" – one cached GPT call per bottle; bundles are assembled
+#               from those fragments with BUNDLE_TEMPLATE, no extra call
+DESCRIPTION_MODE = os.getenv("DESCRIPTION_MODE", "bundle")
+
+BUNDLE_TEMPLATE = (
+    "<p><strong>{title}</strong> – a hand-picked {kind}, bundled at a better price.</p>\n"
+    "{fragments}\n"
+    "<p><em>You must be 21 or older to purchase.</em></p>"
+)
+
+# errors worth another try; anything else fails the call straight away
+_TRANSIENT = (
+    openai.error.RateLimitError,
+    openai.error.APIError,
+    openai.error.Timeout,
+    openai.error.APIConnectionError,
+    openai.error.ServiceUnavailableError,
+)
+
+def _prompt(bundle_name: str) -> str:
+    return (
         f"Write a short HTML description for the liquor bundle: '{bundle_name}'. "
         "Use bold headings and highlight the unique qualities of each bottle. "
         "Include a note about being over 21 to purchase."
     )
 
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=[{"role": "user", "content": prompt}],
-        max_tokens=200,
-        temperature=0.7,
+def _fragment_prompt(bottle_name: str) -> str:
+    return (
+        f"Write one short HTML paragraph (<p>…</p>, 2-3 sentences) about the bottle "
+        f"'{bottle_name}'. Start with its name in <strong> tags, then give tasting notes "
+        "and what makes it special. No headings, no age disclaimer."
     )
 
+# kind → (prompt builder, max_tokens)
+_KINDS = {
+    "bundle": (_prompt, 200),
+    "bottle": (_fragment_prompt, 120),
+}
+
+def _ask(prompt: str, max_tokens: int = 200) -> str:
+    with timer("api.description"):
+        response = openai.ChatCompletion.create(
+            model=MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=max_tokens,
+            temperature=0.7,
+        )
+
     return response.choices[0].message.content.strip()
+
+def assemble_description(title: str, fragments: list[str]) -> str:
+    """Bundle description from per-bottle fragments – pure templating, no API call."""
+    kind = "pair" if len(fragments) == 2 else "trio" if len(fragments) == 3 else "set"
+    return BUNDLE_TEMPLATE.format(title=title, kind=kind, fragments="\n".join(fragments))
+
+
+class DescriptionService:
+    """
+    Bundle descriptions with a persistent cache and a concurrent,
+    rate-limited generator behind it.
+
+    • cache key = bundle name (or bottle name for fragments); model +
+      prompt version are the namespace, so reruns are free and prompt
+      changes don't serve stale copy
+    • prefetch(names) starts generating in the background; get(name)
+      returns the cached/prefetched text or generates it now
+    • fragment mode: get_from_fragments(title, bottle_names) needs one
+      generation per bottle, shared by every bundle that bottle is in
+    • 429s back the shared limiter off; other transient API errors are
+      retried with jittered exponential delay
+    """
+
+    def __init__(self, cache_path: str = "descriptions.sqlite", workers: int = 4,
+                 limiter: TokenBucket | None = None, max_retries: int = 4):
+        self.caches = {
+            "bundle": SqliteCache(cache_path, namespace=f"desc:{MODEL}:{PROMPT_VERSION}"),
+            "bottle": SqliteCache(cache_path, namespace=f"frag:{MODEL}:{FRAGMENT_PROMPT_VERSION}"),
+        }
+        self.limiter = limiter or TokenBucket(
+            float(os.getenv("DESC_REQUESTS_PER_MIN", "500")),
+            float(os.getenv("DESC_TOKENS_PER_MIN", "200000")),
+        )
+        self.max_retries = max_retries
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers))
+        self._inflight: dict[tuple[str, str], Future] = {}
+        self._prefetched: set[tuple[str, str]] = set()     # misses counted by _prefetch, not yet by _get
+        self._lock = threading.Lock()
+
+    def _generate(self, kind: str, name: str) -> str:
+        build, max_tokens = _KINDS[kind]
+        prompt = build(name)
+        tokens = len(prompt) // 4 + max_tokens
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire(tokens)
+            try:
+                text = _ask(prompt, max_tokens)
+            except _TRANSIENT as e:
+                if attempt == self.max_retries:
+                    raise
+                if isinstance(e, openai.error.RateLimitError):
+                    delay = self.limiter.backoff()
+                else:
+                    delay = min(30, 2 ** attempt) * (0.5 + random.random() / 2)
+                    time.sleep(delay)
+                logging.warning(f"[desc] retry {attempt + 1} in {delay:.1f}s → {e}")
+                continue
+            self.limiter.relax()
+            self.caches[kind].set(name, text)
+            return text
+
+    def _future(self, kind: str, name: str) -> Future:
+        key = (kind, name)
+        with self._lock:
+            fut = self._inflight.get(key)
+            if fut is not None:
+                return fut
+            fut = self._pool.submit(self._generate, kind, name)
+            self._inflight[key] = fut
+        # outside the lock: an already-finished future runs the callback inline
+        fut.add_done_callback(lambda f, k=key: self._forget(k, f))
+        return fut
+
+    def _forget(self, key: tuple[str, str], fut: Future):
+        with self._lock:
+            if self._inflight.get(key) is fut:
+                del self._inflight[key]
+
+    def _prefetch(self, kind: str, names):
+        names = list(dict.fromkeys(names))
+        cached = self.caches[kind].get_many(names)
+        for name in names:
+            if name not in cached:
+                with self._lock:
+                    new = (kind, name) not in self._prefetched
+                    self._prefetched.add((kind, name))
+                if new:
+                    count(f"{kind}_description_cache.miss")
+                self._future(kind, name)
+
+    def _get(self, kind: str, name: str) -> str:
+        with self._lock:                    # prefetch already counted this one as a miss
+            counted = (kind, name) in self._prefetched
+            self._prefetched.discard((kind, name))
+        text = self.caches[kind].get(name)
+        if text is not None:
+            if not counted:
+                count(f"{kind}_description_cache.hit")
+            return text
+        if not counted:
+            count(f"{kind}_description_cache.miss")
+        return self._future(kind, name).result()
+
+    def prefetch(self, bundle_names):
+        """Queue generation for every bundle name not already cached."""
+        self._prefetch("bundle", bundle_names)
+
+    def get(self, bundle_name: str) -> str:
+        return self._get("bundle", bundle_name)
+
+    def prefetch_fragments(self, bottle_names):
+        """Queue one fragment per bottle not already cached."""
+        self._prefetch("bottle", bottle_names)
+
+    def get_from_fragments(self, title: str, bottle_names: list[str]) -> str:
+        self.prefetch_fragments(bottle_names)          # run the bottles in parallel
+        return assemble_description(title, [self._get("bottle", n) for n in bottle_names])
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+
+_default_service: DescriptionService | None = None
+_default_lock = threading.Lock()
+
+def default_service() -> DescriptionService:
+    global _default_service
+    with _default_lock:
+        if _default_service is None:
+            _default_service = DescriptionService()
+        return _default_service
+
+@timed("generate_description")
+def generate_description(bundle_name: str, bottle_names: list[str] | None = None,
+                         mode: str | None = None) -> str:
+    """
+    For a simple example, we'll do minimal prompt to GPT.
+    In reality, you can pass brand, flavor notes, etc.
+    Served from the shared DescriptionService, so repeats are cached.
+    mode (default DESCRIPTION_MODE) = "fragments" builds the text from
+    cached per-bottle fragments; bottle_names defaults to splitting the
+    bundle name on " & ".
+    """
+    mode = mode or DESCRIPTION_MODE
+    if mode == "fragments":
+        bottle_names = bottle_names or bundle_name.split(" & ")
+        return default_service().get_from_fragments(bundle_name, bottle_names)
+    if mode != "bundle":
+        raise ValueError(f"unknown description mode {mode!r}")
+    return default_service().get(bundle_name)
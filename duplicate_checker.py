@@ -1,32 +1,178 @@
 # duplicate_checker.py
+# ---------------------------------------------------------------
+# Processed-bundle log: JSON Lines, one bundle name per line.
+#  • appends are O(1) – history is never re-read or rewritten per bundle
+#  • a crash mid-write can only damage the last line, which is skipped
+#  • duplicate lines are folded away by compact()
+# ---------------------------------------------------------------
 import json
 import os
+import threading
 
-def load_processed_items(log_file='bundles_log.json') -> set:
+DEFAULT_LOG = 'bundles_log.jsonl'
+LEGACY_LOG  = 'bundles_log.json'      # old format: one JSON array, rewritten every save
+
+
+def _read_names(log_file: str) -> tuple[set, int]:
+    """Return (unique names, line count). Unreadable lines are skipped."""
+    with open(log_file, 'r', encoding='utf-8') as f:
+        head = f.read(1)
+        while head.isspace():
+            head = f.read(1)
+        f.seek(0)
+        if head == '[':                       # legacy JSON array
+            try:
+                data = json.load(f)
+                return (set(data), len(data)) if isinstance(data, list) else (set(), 0)
+            except json.JSONDecodeError:
+                print(f"[!] {log_file} is invalid JSON — starting empty.")
+                return set(), 0
+        lines = [ln for ln in f.read().splitlines() if ln.strip()]
+
+    try:                                      # fast path: one parse for the whole file
+        return set(json.loads('[' + ','.join(lines) + ']')), len(lines)
+    except json.JSONDecodeError:
+        names = set()
+        for ln in lines:
+            try:
+                names.add(json.loads(ln))
+            except json.JSONDecodeError:
+                print(f"[!] {log_file}: skipping unreadable line {ln[:60]!r}")
+        return names, len(lines)
+
+
+def _open_append(log_file: str):
+    """Open for appending, first terminating a torn last line from a crash."""
+    torn = False
+    if os.path.exists(log_file) and os.path.getsize(log_file):
+        with open(log_file, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            torn = f.read(1) != b'\n'
+    fh = open(log_file, 'a', encoding='utf-8')
+    if torn:
+        fh.write('\n')
+    return fh
+
+
+def _needs_migration(log_file: str) -> bool:
+    """True if the default .jsonl log doesn't exist yet but the old bundles_log.json does."""
+    return log_file == DEFAULT_LOG and not os.path.exists(log_file) and os.path.exists(LEGACY_LOG)
+
+
+def _is_legacy(log_file: str) -> bool:
+    """True if the file still holds the old single-JSON-array format."""
+    if not os.path.exists(log_file):
+        return False
+    with open(log_file, 'r', encoding='utf-8') as f:
+        return f.read(64).lstrip().startswith('[')
+
+
+class ProcessedLog:
+    """
+    In-memory set of processed bundle names backed by an append-only
+    JSON Lines file. Safe to share between threads.
+
+    Compaction (rewrite with one line per unique name, atomically via
+    os.replace) runs on load once duplicate lines outnumber unique ones.
+    """
+
+    def __init__(self, log_file: str = DEFAULT_LOG, durable: bool = False):
+        self.log_file = log_file
+        self.durable = durable                # fsync after each write
+        self._lock = threading.Lock()
+        self._fh = None
+        self.items: set = set()
+        lines = 0
+
+        if os.path.exists(log_file):
+            try:
+                self.items, lines = _read_names(log_file)
+            except Exception as e:
+                print(f"[!] Could not read {log_file}: {e}")
+        elif _needs_migration(log_file):
+            self.items, _ = _read_names(LEGACY_LOG)
+            print(f"[i] Migrating {len(self.items)} names from {LEGACY_LOG} → {log_file}")
+            lines = -1                        # force a write of the new file
+
+        if lines < 0 or lines > 2 * len(self.items) or _is_legacy(log_file):
+            self.compact()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.items
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def snapshot(self) -> frozenset:
+        """Names processed so far, frozen – safe to iterate while other threads add()."""
+        with self._lock:
+            return frozenset(self.items)
+
+    def _write(self, names: list[str]):
+        if self._fh is None:
+            self._fh = _open_append(self.log_file)
+        self._fh.write(''.join(json.dumps(n, ensure_ascii=False) + '\n' for n in names))
+        self._fh.flush()
+        if self.durable:
+            os.fsync(self._fh.fileno())
+
+    def add(self, name: str):
+        self.add_many([name])
+
+    def add_many(self, names):
+        with self._lock:
+            new = [n for n in dict.fromkeys(names) if n not in self.items]
+            if not new:
+                return
+            self._write(new)
+            self.items.update(new)
+
+    def compact(self):
+        """Rewrite the log with one line per unique name (atomic replace)."""
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+            tmp = self.log_file + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                for name in sorted(self.items):
+                    f.write(json.dumps(name, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.log_file)
+
+    def close(self):
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+
+def load_processed_items(log_file=DEFAULT_LOG) -> set:
     """
     Return a set of bundle names already processed.
-    If the file is empty, missing, or malformed JSON, return an empty set.
+    A missing file gives an empty set; unreadable lines are skipped.
+    The old bundles_log.json is migrated first, as ProcessedLog does.
     """
+    if _needs_migration(log_file):
+        ProcessedLog(log_file).close()        # writes the .jsonl from the legacy file
     if not os.path.exists(log_file):
         return set()
-
     try:
-        with open(log_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            if isinstance(data, list):
-                return set(data)
-    except json.JSONDecodeError:
-        print(f"[!] {log_file} is empty or invalid JSON — resetting.")
+        return _read_names(log_file)[0]
     except Exception as e:
         print(f"[!] Could not read {log_file}: {e}")
+        return set()
+
+
+def save_processed_item(item_name: str, log_file=DEFAULT_LOG):
+    """Append one name to the log (O(1); no re-read of the history)."""
+    save_processed_items([item_name], log_file)
 
-    # If we get here, treat as empty and reset file
-    with open(log_file, 'w', encoding='utf-8') as f:
-        json.dump([], f)
-    return set()
 
-def save_processed_item(item_name: str, log_file='bundles_log.json'):
-    processed = load_processed_items(log_file)
-    processed.add(item_name)
-    with open(log_file, 'w', encoding='utf-8') as f:
-        json.dump(list(processed), f, ensure_ascii=False, indent=2)
+def save_processed_items(item_names, log_file=DEFAULT_LOG):
+    """Append several names in one write."""
+    if _needs_migration(log_file) or _is_legacy(log_file):
+        ProcessedLog(log_file).close()        # converts the file to JSON Lines
+    with _open_append(log_file) as f:
+        f.write(''.join(json.dumps(n, ensure_ascii=False) + '\n' for n in item_names))
@@ -2,27 +2,96 @@
 
 import os
 import io
-from rembg import remove
+import json
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, asdict
+from rembg import remove, new_session
 from PIL import Image
+from cutout_cache import CutoutCache
+from compose_manifest import ComposeManifest
+from metrics import timed, timer
+
+CANVAS = 900
+LAYOUT_VERSION = 1          # bump when the composition itself changes
+
+_EXTS = {"JPEG": ".jpg", "WEBP": ".webp", "PNG": ".png"}
+_FORMATS = {".jpg": "JPEG", ".jpeg": "JPEG", ".webp": "WEBP", ".png": "PNG"}
+
+@dataclass(frozen=True)
+class OutputSpec:
+    """One file written from the composed canvas: <root><suffix>.<ext>."""
+    suffix: str = ""
+    format: str = "JPEG"
+    size: int | None = None     # square edge in px; None = full canvas
+    quality: int = 90
+
+    def path_for(self, output_path: str) -> str:
+        root, ext = os.path.splitext(output_path)
+        if _FORMATS.get(ext.lower()) != self.format:
+            ext = _EXTS[self.format]
+        return root + self.suffix + ext
+
+DEFAULT_OUTPUTS = (OutputSpec(),)   # one full-size JPEG, as before
 
 class ImageComposer:
-    def __init__(self, output_size=(1200, 1200)):
+    def __init__(self, output_size=(1200, 1200), cache_dir: str | None = "cutouts",
+                 model_name: str = "u2net", outputs=DEFAULT_OUTPUTS,
+                 manifest: ComposeManifest | None = None):
+        """
+        cache_dir: where background-removed cut-outs are kept between runs
+                   (None disables the cache and segments every time).
+        outputs:   OutputSpecs encoded from each composed canvas; the first
+                   one is the path callers get back.
+        manifest:  skip bundles whose inputs and settings haven't changed
+                   since their files were written (checked in this process,
+                   before any work is sent to a pool).
+        """
         self.output_size = output_size
+        self.cache_dir = cache_dir
+        self.model_name = model_name
+        self.outputs = tuple(outputs)
+        self.manifest = manifest
+        self.cutouts = CutoutCache(cache_dir, model_name) if cache_dir else None
+        self._session = None                # ONNX model, loaded on first use
 
-    def remove_background(self, image_bytes: bytes) -> Image.Image:
-        output = remove(image_bytes)
+    @property
+    def session(self):
+        if self._session is None:
+            self._session = new_session(self.model_name)
+        return self._session
+
+    def _segment(self, image_bytes: bytes) -> Image.Image:
+        with timer("rembg"):
+            output = remove(image_bytes, session=self.session)
         return Image.open(io.BytesIO(output)).convert("RGBA")
 
+    def remove_background(self, image_bytes: bytes) -> Image.Image:
+        if self.cutouts is None:
+            return self._segment(image_bytes)
+        return self.cutouts.get_or_create(image_bytes, self._segment)
+
+    def settings_key(self) -> str:
+        """Everything besides the input images that decides the output files."""
+        return json.dumps({"layout": LAYOUT_VERSION, "canvas": CANVAS, "model": self.model_name,
+                           "outputs": [asdict(o) for o in self.outputs]}, sort_keys=True)
+
+    def output_paths(self, output_path: str) -> list[str]:
+        return [o.path_for(output_path) for o in self.outputs]
+
+    @timed("create_bundle_image")
     def create_bundle_image(self, image_paths: list[str], output_path: str):
         """
-        900×900 bundle photo.
-        • Remove BGs.
-        • Keep native size unless a bottle is wider than 430 px or taller than 850 px;
-          then shrink proportionally so it fits.
+        900×900 bundle photo, encoded once per OutputSpec (full-size JPEG,
+        WebP, thumbnails …) from the same canvas. Returns the first path.
+        • Remove BGs (cached per source image).
+        • One slot per bottle (two 450-px halves, or three 300-px thirds).
+        • Keep native size unless a bottle is wider than its slot minus 20 px
+          (430 px for a pair) or taller than 850 px; then shrink proportionally.
         • Align bottles on the same baseline; no extra lines or shadows.
         """
         processed = []
-        MAX_W, MAX_H = 430, 850   # per-bottle limits inside its 450-px half
+        slot_w = CANVAS // len(image_paths)   # 450-px halves for a pair, thirds for a trio
+        MAX_W, MAX_H = slot_w - 20, 850    # per-bottle limits inside its slot
 
         for path in image_paths:
             with open(path, "rb") as f:
@@ -35,18 +104,104 @@ class ImageComposer:
 
             processed.append(img)
 
-        left, right = processed
-        canvas = Image.new("RGBA", (900, 900), (255, 255, 255, 255))
+        canvas = Image.new("RGBA", (CANVAS, CANVAS), (255, 255, 255, 255))
 
-        half_w   = 450
         baseline = 890                      # 10-px bottom margin
-        x_left   = (half_w - left.width)  // 2
-        x_right  = half_w + (half_w - right.width) // 2
-        y_left   = baseline - left.height
-        y_right  = baseline - right.height
+        for slot, img in enumerate(processed):
+            x = slot * slot_w + (slot_w - img.width) // 2
+            y = baseline - img.height
+            canvas.paste(img, (x, y), img)
+
+        rgb = canvas.convert("RGB")
+        for spec in self.outputs:
+            img = rgb
+            if spec.size and spec.size != CANVAS:
+                img = rgb.resize((spec.size, spec.size), Image.LANCZOS)
+            img.save(spec.path_for(output_path), format=spec.format, quality=spec.quality)
+        return self.outputs[0].path_for(output_path)
+
+    def _fresh(self, job) -> tuple[str | None, str | None]:
+        """(primary path if the manifest says job is up to date, manifest key)."""
+        if self.manifest is None:
+            return None, None
+        paths, output_path = job
+        key = self.manifest.key(paths, self.settings_key())
+        primary = self.outputs[0].path_for(output_path)
+        return (primary if self.manifest.fresh(primary, key) else None), key
+
+    def _record(self, job, key: str | None, result: str | None):
+        if self.manifest is not None and result is not None:
+            self.manifest.record(result, key, self.output_paths(job[1]))
+
+    def create_bundle_images(self, jobs: list[tuple[list[str], str]],
+                             workers: int | None = None) -> list[str | None]:
+        """
+        Compose many bundles: jobs = [(image_paths, output_path), …].
+        Runs on a process pool (workers=None → one per CPU); each worker
+        builds its own composer, so the model loads once per process.
+        Results come back in job order; a failed job yields None.
+        workers=1 composes in-process with this composer.
+        """
+        if not jobs:
+            return []
+        checked = [self._fresh(job) for job in jobs]
+        results = [done for done, _ in checked]
+        todo = [n for n, done in enumerate(results) if done is None]
+        if todo and workers == 1:
+            made = [_compose(self, jobs[n]) for n in todo]
+        elif todo:
+            with self.process_pool(workers) as pool:
+                made = list(pool.map(_compose_in_worker, [jobs[n] for n in todo]))
+        else:
+            made = []
+        for n, result in zip(todo, made):
+            self._record(jobs[n], checked[n][1], result)
+            results[n] = result
+        return results
+
+    def process_pool(self, workers: int | None = None) -> ProcessPoolExecutor:
+        """Process pool whose workers each hold a composer with these settings."""
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(self.output_size, self.cache_dir, self.model_name, self.outputs),
+        )
+
+    def create_bundle_image_on(self, pool: ProcessPoolExecutor | None,
+                               image_paths: list[str], output_path: str) -> str | None:
+        """
+        Compose one bundle on `pool` (from process_pool()) and wait for it;
+        pool=None composes in-process. Returns the first output's path (the
+        one the manifest already has, if nothing changed), or None on failure.
+        """
+        job = (image_paths, output_path)
+        done, key = self._fresh(job)
+        if done is not None:
+            return done
+        with timer("compose"):
+            if pool is None:
+                result = _compose(self, job)
+            else:
+                result = pool.submit(_compose_in_worker, job).result()
+        self._record(job, key, result)
+        return result
+
+# -- process-pool plumbing (module level so it pickles) -----------
+_worker_composer: ImageComposer | None = None
+
+def _init_worker(output_size, cache_dir, model_name, outputs=DEFAULT_OUTPUTS):
+    global _worker_composer
+    _worker_composer = ImageComposer(output_size, cache_dir=cache_dir, model_name=model_name,
+                                     outputs=outputs)
+    _worker_composer.session            # load the model up front, once per worker
 
-        canvas.paste(left,  (x_left,  y_left),  left)
-        canvas.paste(right, (x_right, y_right), right)
+def _compose(composer: ImageComposer, job) -> str | None:
+    paths, output_path = job
+    try:
+        return composer.create_bundle_image(paths, output_path)
+    except Exception as e:
+        print(f"[img] compose failed for {output_path}: {e}")
+        return None
 
-        canvas.convert("RGB").save(output_path, quality=90)
-        return output_path
+def _compose_in_worker(job) -> str | None:
+    return _compose(_worker_composer, job)
@@ -0,0 +1,146 @@
+# image_store.py
+# ---------------------------------------------------------------
+# Background product-image downloader with a content-addressed store.
+#  • bounded worker pool sharing one keep-alive requests.Session
+#  • conditional GETs (ETag / Last-Modified) – unchanged images cost a 304
+#  • files are named by SHA-256 of their bytes, so two products whose
+#    URLs end in the same filename never overwrite each other, and
+#    identical images are stored once
+# ---------------------------------------------------------------
+
+import hashlib
+import json
+import mimetypes
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import requests
+from metrics import count, timer
+from requests.adapters import HTTPAdapter
+
+_INDEX_NAME = "index.json"
+
+
+class ImageDownloader:
+    """
+    submit(url) → Future[local path | None]; downloads run off the caller's
+    thread. The url → {etag, last_modified, sha256, path} index lives in
+    <folder>/index.json and is written by flush()/close().
+    """
+
+    def __init__(self, folder: str = "images", workers: int = 8,
+                 session: requests.Session | None = None, timeout: float = 20):
+        self.folder = folder
+        self.timeout = timeout
+        os.makedirs(folder, exist_ok=True)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        self.session = session
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers))
+        self._lock = threading.Lock()
+        self._pending: dict[str, Future] = {}
+        self._index_path = os.path.join(folder, _INDEX_NAME)
+        self._index: dict[str, dict] = {}
+        if os.path.exists(self._index_path):
+            try:
+                with open(self._index_path, "r", encoding="utf-8") as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"[img] ignoring unreadable {self._index_path}: {e}")
+
+    # -- public ---------------------------------------------------
+    def submit(self, url: str) -> Future:
+        """Queue a download; the same URL is only fetched once per downloader."""
+        with self._lock:
+            fut = self._pending.get(url)
+            if fut is None:
+                fut = self._pool.submit(self.download, url)
+                self._pending[url] = fut
+            return fut
+
+    def stored_path(self, url: str) -> str | None:
+        """Local path of an earlier download of url, if its file is still there – no network."""
+        with self._lock:
+            path = self._index.get(url, {}).get("path")
+        return path if path and os.path.exists(path) else None
+
+    def download(self, url: str) -> str | None:
+        """Fetch (or revalidate) one URL now; return the local path or None."""
+        with self._lock:
+            entry = dict(self._index.get(url, {}))
+        cached = entry.get("path")
+        if cached and not os.path.exists(cached):
+            entry, cached = {}, None
+
+        headers = {}
+        if cached:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        try:
+            with timer("image.fetch"):
+                r = self.session.get(url, headers=headers, timeout=self.timeout)
+        except Exception as e:
+            print(f"[img] {e}")
+            count("image_cache.error")
+            return cached                       # stale copy beats nothing
+
+        if r.status_code == 304 and cached:
+            count("image_cache.hit")
+            return cached
+        if r.status_code != 200:
+            count("image_cache.error")
+            return cached
+        count("image_cache.miss")
+        count("image_cache.hit", 0)             # so an all-miss run still reports a hit rate
+
+        digest = hashlib.sha256(r.content).hexdigest()
+        path = os.path.join(self.folder, digest + _extension(url, r.headers.get("Content-Type")))
+        if not os.path.exists(path):
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(r.content)
+            os.replace(tmp, path)
+
+        with self._lock:
+            self._index[url] = {
+                "etag": r.headers.get("ETag"),
+                "last_modified": r.headers.get("Last-Modified"),
+                "sha256": digest,
+                "path": path,
+            }
+        return path
+
+    def flush(self):
+        """Write the URL index (atomic replace)."""
+        with self._lock:
+            data = json.dumps(self._index, ensure_ascii=False)
+        tmp = f"{self._index_path}.{threading.get_ident()}.tmp"   # flushes may overlap
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp, self._index_path)
+
+    def close(self):
+        """Wait for queued downloads, then persist the index."""
+        self._pool.shutdown(wait=True)
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _extension(url: str, content_type: str | None) -> str:
+    ext = os.path.splitext(url.split("?")[0])[1].lower()
+    if ext in (".jpg", ".jpeg", ".png", ".webp", ".gif"):
+        return ext
+    guessed = mimetypes.guess_extension((content_type or "").split(";")[0].strip())
+    return guessed or ".img"
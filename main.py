@@ -1,64 +1,230 @@
 # main.py
+#   python main.py                      → Tequila only (as before)
+#   python main.py Gin Rum --merged     → two categories, one CSV
+#   python main.py --all --workers 3    → every known category, 3 at a time
+#   python main.py --bundle-size 3      → 3-bottle gift sets instead of pairs
 
+import argparse
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import openai
 from dotenv import load_dotenv
-from scraper import scrape_bottlebuzz_category
-from duplicate_checker import load_processed_items, save_processed_item
+from scraper import scrape_bottlebuzz_category, make_session
+from browser_pool import BrowserPool
+from image_store import ImageDownloader
+from duplicate_checker import ProcessedLog
+from catalog_snapshot import CatalogSnapshot
+from catalog import Catalog
 from bundler import generate_bundles
-from image_composer import ImageComposer
-from description_builder import generate_description
-from csv_exporter import export_to_shopify_csv
+from image_composer import ImageComposer, OutputSpec
+from compose_manifest import ComposeManifest
+from description_builder import generate_description, default_service, DESCRIPTION_MODE
+from csv_exporter import ShopifyCsvWriter
+from pipeline import Pipeline, Stage
+from metrics import METRICS
 load_dotenv()
 
 # 1) Set your OpenAI key
-CATEGORY_NAME   = "Tequila"
+CATEGORY_NAME   = "Tequila"  # default when no category is given on the command line
 openai.api_key = os.getenv("OPENAI_API_KEY")
-CSV_OUT         = f"exported_bundles_{CATEGORY_NAME.lower()}.csv"
-def main():
+CATEGORY_URLS = {
+    'Tequila': "https://bottlebuzz.com/collections/tequila",
+    'Whiskey': "https://bottlebuzz.com/collections/whiskey",
+    'Vodka':   "https://bottlebuzz.com/collections/vodka",
+    'Gin':     "https://bottlebuzz.com/collections/gin",
+    'Rum':     "https://bottlebuzz.com/collections/rum",
+    'Cognac':  "https://bottlebuzz.com/collections/cognac",
+    'Mezcal':  "https://bottlebuzz.com/collections/mezcal",
+    'Liqueur': "https://bottlebuzz.com/collections/liqueur",
+    'Brandy':  "https://bottlebuzz.com/collections/brandy",
+}
+TOTAL_PAGES     = 3      # or more pages if needed
+CATEGORY_WORKERS = 3     # categories processed at the same time
+BROWSER_WORKERS = 3      # headless Chrome instances, only started if a page needs JS
+COMPOSE_WORKERS = None   # None = one process per CPU core; 1 = compose in-process
+DESCRIBE_WORKERS = 4     # concurrent GPT description calls
+PIPE_REPORT_SECS = 10    # how often to print per-stage queue depth
+BUNDLE_SIZE     = 2      # bottles per bundle: 2 (pairs) or 3 (gift sets)
+# every composed bundle canvas is encoded into each of these; the first
+# one is what the CSV's image column points at
+BUNDLE_IMAGE_OUTPUTS = (
+    OutputSpec("",       "JPEG", quality=90),             # 900×900
+    OutputSpec("",       "WEBP", quality=85),
+    OutputSpec("_thumb", "JPEG", size=300, quality=85),
+)
+
+def csv_path(category: str) -> str:
+    return f"exported_bundles_{category.lower()}.csv"
+
+class Shared:
+    """
+    Everything categories have in common, created once per invocation:
+    HTTP session + image downloader, browser pool (lazy), bundle log,
+    composer (cut-out cache, compose manifest) and its process pool, and
+    optionally one merged CSV writer.
+    The score and description caches are already process-wide singletons.
+    """
+    def __init__(self, backend="auto", merged_csv: str | None = None):
+        self.backend = backend
+        self.session = make_session(16)
+        self.downloader = ImageDownloader("images", session=self.session)
+        self.browser = BrowserPool(BROWSER_WORKERS)
+        self.processed_log = ProcessedLog('bundles_log.jsonl')
+        self.manifest = ComposeManifest("bundle_images/manifest.json")
+        self.composer = ImageComposer((1200, 1200), outputs=BUNDLE_IMAGE_OUTPUTS,
+                                      manifest=self.manifest)
+        self.pool = None if COMPOSE_WORKERS == 1 else self.composer.process_pool(COMPOSE_WORKERS)
+        self.merged = ShopifyCsvWriter(merged_csv) if merged_csv else None
+        self._csv_lock = threading.Lock()       # one merged writer, many categories
+
+    def close(self):
+        if self.merged is not None:
+            self.merged.close()
+        if self.pool is not None:
+            self.pool.shutdown()
+        self.manifest.save()
+        self.downloader.close()
+        self.browser.close()
+        self.processed_log.close()
+
+def run_category(category: str, shared: Shared, total_pages: int = TOTAL_PAGES,
+                 bundle_size: int = BUNDLE_SIZE) -> int:
+    """Scrape → bundle → compose/describe/export one category. Returns bundles written."""
     # 2) Scrape the site
-    category_url = "https://bottlebuzz.com/collections/tequila"
-    scraped_bottles = scrape_bottlebuzz_category(category_url, total_pages=3)  # or more pages if needed
-    print(f"[i] Scraped {len(scraped_bottles)} tequila bottles.")
+    category_url = CATEGORY_URLS[category]
+    snapshot = CatalogSnapshot(f"catalog_snapshot_{category.lower()}.json")
+    scraped_bottles = scrape_bottlebuzz_category(category_url, total_pages=total_pages,
+                                                 backend=shared.backend,
+                                                 session=shared.session,
+                                                 downloader=shared.downloader,
+                                                 snapshot=snapshot,
+                                                 browser=shared.browser)
+    print(f"[i] {category}: scraped {len(scraped_bottles)} bottles.")
+
+    # 2b) What changed since last run? Reported only – nothing below uses the
+    #     diff. Unchanged bottles already skipped their image download in the
+    #     scraper, and bundling looks at every bottle: price-only bundling is
+    #     free, and each run should fill the next batch of not-yet-processed
+    #     bundles, whether or not anything changed.
+    diff = snapshot.diff(scraped_bottles)
+    print(f"[i] {category}: catalog diff: {diff.summary()}.")
 
-    # 3) Load existing bundles from log (avoid duplicates)
-    existing_bundles = load_processed_items('bundles_log.json')
+    # 3) Existing bundles come from the shared log (avoid duplicates). Other
+    #    categories keep adding to it, so bundle against a frozen copy.
+    processed_log = shared.processed_log
+    existing_bundles = processed_log.snapshot()
 
-    # 4) Generate new bundles
-    new_bundles = generate_bundles(scraped_bottles, existing_bundles)
-    print(f"[i] Generated {len(new_bundles)} potential new bundles.")
+    # 4) Generate new bundles (columnar catalog: brands/prices/volumes parsed once)
+    catalog = Catalog.from_bottles(scraped_bottles)
+    new_bundles = generate_bundles(catalog, existing_bundles, k=bundle_size)
+    print(f"[i] {category}: generated {len(new_bundles)} potential new bundles.")
 
-    # 5) Compose images for each new bundle (optional)
-    composer = ImageComposer((1200, 1200))
-    final_bundles = []
-    for b in new_bundles:
+    # 5-7) Streaming pipeline: compose → describe → CSV row, all overlapping.
+    #       Bounded queues between stages give backpressure; depth is
+    #       reported every PIPE_REPORT_SECS.
+    # GPT runs while images compose
+    if DESCRIPTION_MODE == "fragments":
+        default_service().prefetch_fragments(bt["name"] for b in new_bundles for bt in b["bottles"])
+    else:
+        default_service().prefetch(b["name"] for b in new_bundles)
+    composer, pool = shared.composer, shared.pool
+    compose_threads = COMPOSE_WORKERS or os.cpu_count() or 1
 
+    def compose(b):
         # ✅ use paths captured by the scraper
-        p1 = b["bottles"][0].get("image_path", "")
-        p2 = b["bottles"][1].get("image_path", "")
+        paths = [bt.get("image_path", "") for bt in b["bottles"]]
 
-        if p1 and p2 and os.path.exists(p1) and os.path.exists(p2):
+        if all(p and os.path.exists(p) for p in paths):
             os.makedirs("bundle_images", exist_ok=True)
             out_path = os.path.join(
                 "bundle_images",
                 b["name"].replace(' ', '_') + ".jpg"
             )
-            composer.create_bundle_image([p1, p2], out_path)
-            b["image_src"] = out_path
+            b["image_src"] = composer.create_bundle_image_on(pool, paths, out_path) or ""
         else:
             print(f"[img] missing file for bundle {b['name']}")
             b["image_src"] = ""   # or skip the bundle entirely
+        return b
 
+    def describe(b):
         # metadata …
-        b["description"] = generate_description(b["name"])
-        b["category"]    = CATEGORY_NAME
-        final_bundles.append(b)
-        save_processed_item(b["name"], "bundles_log.json")
+        b["description"] = generate_description(b["name"], [bt["name"] for bt in b["bottles"]])
+        b["category"]    = category
+        return b
+
+    pipe = Pipeline([
+        Stage(f"{category}/compose",  compose,  workers=compose_threads,  queue_size=2 * compose_threads),
+        Stage(f"{category}/describe", describe, workers=DESCRIBE_WORKERS, queue_size=2 * DESCRIBE_WORKERS),
+    ], report_every=PIPE_REPORT_SECS)
+
+    own_writer = shared.merged is None
+    writer = ShopifyCsvWriter(csv_path(category)) if own_writer else shared.merged
+    written = 0
+    try:
+        for b in pipe.run(new_bundles):
+            if own_writer:
+                writer.write(b)
+            else:
+                with shared._csv_lock:
+                    writer.write(b)
+            processed_log.add(b["name"])
+            written += 1
+        snapshot.update(scraped_bottles)      # only once the run got through
+        snapshot.save()
+    finally:
+        if own_writer:
+            writer.close()
+    return written
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Scrape, bundle and export BottleBuzz categories.")
+    ap.add_argument('categories', nargs='*', metavar='CATEGORY',
+                    help=f"any of: {', '.join(CATEGORY_URLS)} (default: {CATEGORY_NAME})")
+    ap.add_argument('--all', action='store_true', help="every known category")
+    ap.add_argument('--pages', type=int, default=TOTAL_PAGES)
+    ap.add_argument('--workers', type=int, default=CATEGORY_WORKERS,
+                    help="categories processed in parallel")
+    ap.add_argument('--backend', choices=('auto', 'http', 'browser'), default='auto')
+    ap.add_argument('--bundle-size', type=int, choices=(2, 3), default=BUNDLE_SIZE,
+                    help="bottles per bundle (3 = gift sets)")
+    ap.add_argument('--report', default='run_report.json', metavar='JSON',
+                    help="timers, counters and cache hit rates for this run")
+    ap.add_argument('--profile', default=None, metavar='TIMER',
+                    help="cProfile one timed stage, e.g. scrape, compose, generate_description")
+    ap.add_argument('--merged', nargs='?', const='exported_bundles_all.csv', default=None,
+                    metavar='CSV', help="write one merged CSV instead of one per category")
+    args = ap.parse_args(argv)
+
+    categories = list(CATEGORY_URLS) if args.all else (args.categories or [CATEGORY_NAME])
+    lookup = {c.lower(): c for c in CATEGORY_URLS}
+    unknown = [c for c in categories if c.lower() not in lookup]
+    if unknown:
+        ap.error(f"unknown category: {', '.join(unknown)}")
+    categories = list(dict.fromkeys(lookup[c.lower()] for c in categories))
 
-    # 7) Export to Shopify CSV
-    export_to_shopify_csv(final_bundles, output_file=CSV_OUT)
+    METRICS.profile_stage(args.profile)
+    shared = Shared(backend=args.backend, merged_csv=args.merged)
+    totals = {}
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(args.workers, len(categories)))) as ex:
+            futures = {c: ex.submit(run_category, c, shared, args.pages, args.bundle_size) for c in categories}
+            for c, fut in futures.items():
+                try:
+                    totals[c] = fut.result()
+                except Exception as e:
+                    print(f"[✗] {c} failed: {e}")
+    finally:
+        shared.close()
+        METRICS.report(args.report, extra={"categories": totals})
 
-    print("[✓] Pipeline completed successfully.")
+    for c in categories:
+        print(f"[i] {c}: {totals[c]} bundles" if c in totals else f"[i] {c}: failed")
+    failed = len(categories) - len(totals)
+    if failed:
+        print(f"[!] Pipeline finished with {failed} failed categor{'y' if failed == 1 else 'ies'}.")
+    else:
+        print("[✓] Pipeline completed successfully.")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,167 @@
+# metrics.py
+# ---------------------------------------------------------------
+# Lightweight run instrumentation, shared by every module.
+#  • timers:     with timer("scrape"): …   or   @timed("score_pair")
+#  • counters:   count("score_cache.hit")
+#  • histograms: observe("api.score", seconds)   (timers feed these too)
+#  • report("run_report.json") → counts, totals, p50/p90/p99 and
+#    hit rates for every "<name>.hit" / "<name>.miss" counter pair
+#  • profile_stage("compose") → cProfile one timer's scope, saved as
+#    <report>.<stage>.prof next to the report
+# Everything is in-process: work done inside pool worker processes is
+# only seen through the timers wrapped around it in the parent.
+# ---------------------------------------------------------------
+
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+_MAX_SAMPLES = 10_000          # per histogram; keeps memory flat on long runs
+
+
+class _Histogram:
+    __slots__ = ("count", "total", "max", "samples", "_next")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples: list[float] = []
+        self._next = 0                          # ring slot the next overflow sample replaces
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        if len(self.samples) < _MAX_SAMPLES:
+            self.samples.append(value)
+        else:                                   # ring buffer: keep the latest
+            self.samples[self._next] = value        # overwrite the oldest, slot 0 first
+            self._next = (self._next + 1) % _MAX_SAMPLES
+
+    def summary(self) -> dict:
+        s = sorted(self.samples)
+
+        def pct(p):
+            return s[min(len(s) - 1, int(p / 100 * len(s)))] if s else 0.0
+
+        return {
+            "count": self.count,
+            "total": round(self.total, 6),
+            "mean": round(self.total / self.count, 6) if self.count else 0.0,
+            "p50": round(pct(50), 6),
+            "p90": round(pct(90), 6),
+            "p99": round(pct(99), 6),
+            "max": round(self.max, 6),
+        }
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: dict[str, int] = {}
+        self.histograms: dict[str, _Histogram] = {}
+        self.started = time.time()
+        self._profile_stage: str | None = None
+        self._profiler: cProfile.Profile | None = None
+        self._profile_lock = threading.Lock()
+
+    # -- recording --------------------------------------------------
+    def count(self, name: str, n: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name: str, value: float):
+        with self._lock:
+            h = self.histograms.get(name)
+            if h is None:
+                h = self.histograms[name] = _Histogram()
+            h.add(value)
+
+    @contextmanager
+    def timer(self, name: str):
+        prof = self._start_profile(name)
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0)
+            if prof:
+                self._profiler.disable()
+                self._profile_lock.release()
+
+    def timed(self, name: str):
+        """Decorator form of timer()."""
+        def wrap(fn):
+            @functools.wraps(fn)
+            def inner(*a, **kw):
+                with self.timer(name):
+                    return fn(*a, **kw)
+            return inner
+        return wrap
+
+    # -- profiling --------------------------------------------------
+    def profile_stage(self, name: str | None):
+        """cProfile every (non-overlapping) entry into timer(name)."""
+        self._profile_stage = name
+        self._profiler = cProfile.Profile() if name else None
+
+    def _start_profile(self, name: str) -> bool:
+        if name != self._profile_stage or self._profiler is None:
+            return False
+        if not self._profile_lock.acquire(blocking=False):
+            return False                        # one thread at a time
+        self._profiler.enable()
+        return True
+
+    # -- output -----------------------------------------------------
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+            timers = {k: h.summary() for k, h in sorted(self.histograms.items())}
+        rates = {}
+        for key in counters:
+            if key.endswith(".hit"):
+                base = key[:-4]
+                hits, misses = counters[key], counters.get(base + ".miss", 0)
+                rates[base] = round(hits / (hits + misses), 4) if hits + misses else 0.0
+        return {
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "wall_seconds": round(time.time() - self.started, 3),
+            "timers": timers,
+            "counters": dict(sorted(counters.items())),
+            "hit_rates": rates,
+        }
+
+    def report(self, path: str = "run_report.json", extra: dict | None = None) -> dict:
+        data = self.snapshot()
+        if extra:
+            data.update(extra)
+        if self._profiler is not None:
+            prof_path = f"{path.rsplit('.', 1)[0]}.{self._profile_stage}.prof"
+            self._profiler.dump_stats(prof_path)
+            data["profile"] = prof_path
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, path)
+        print(f"[i] Run report → {path}")
+        return data
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.started = time.time()
+
+
+# process-wide registry + module-level shortcuts
+METRICS = Metrics()
+count = METRICS.count
+observe = METRICS.observe
+timer = METRICS.timer
+timed = METRICS.timed
@@ -0,0 +1,104 @@
+# pair_engine.py
+# ---------------------------------------------------------------
+# Price-sorted candidate engine for cross-brand bundle pairs.
+# ---------------------------------------------------------------
+
+import numpy as np
+
+_EPS = 1e-9   # slack for the window search; the exact check runs afterwards
+
+
+def brand_ids(bottles: list[dict]) -> np.ndarray:
+    """
+    Intern lower-cased brands into small ints so brand checks are
+    integer compares instead of repeated str.lower() calls.
+    """
+    ids: dict[str, int] = {}
+    return np.fromiter(
+        (ids.setdefault(b["brand"].lower(), len(ids)) for b in bottles),
+        dtype=np.int64, count=len(bottles),
+    )
+
+
+def same_brand_pair_chunks(brands: np.ndarray, chunk: int = 65536):
+    """
+    Yield (i, j) int64 arrays of every same-brand pair, i < j, in the
+    order of itertools.combinations within each brand group, groups in
+    order of first appearance – the order a brand → [bottles] dict gives.
+    """
+    n = len(brands)
+    if n < 2:
+        return
+
+    order = np.argsort(brands, kind="stable")
+    sorted_brands = brands[order]
+    starts = np.flatnonzero(np.r_[True, sorted_brands[1:] != sorted_brands[:-1]])
+    ends = np.r_[starts[1:], n]
+
+    bi, bj, size = [], [], 0
+    for g in np.argsort(order[starts], kind="stable"):     # first-appearance order
+        members = order[starts[g]:ends[g]]
+        if members.size < 2:
+            continue
+        a, b = np.triu_indices(members.size, 1)            # combinations order
+        bi.append(members[a])
+        bj.append(members[b])
+        size += a.size
+        if size >= chunk:
+            yield np.concatenate(bi), np.concatenate(bj)
+            bi, bj, size = [], [], 0
+    if size:
+        yield np.concatenate(bi), np.concatenate(bj)
+
+
+def cross_brand_pairs(bottles: list[dict], max_diff: float = 10):
+    """
+    Yield (i, j) index pairs, i < j, of bottles from different brands
+    whose prices differ by at most `max_diff`.
+
+    Pairs come out in the same order as itertools.combinations(bottles, 2),
+    but only bottles inside each price window are ever visited, so the
+    cost is ~ n × (bottles per $-band) instead of n².
+    """
+    n = len(bottles)
+    if n < 2:
+        return
+
+    prices = np.fromiter((b["price"] for b in bottles), dtype=np.float64, count=n)
+    for i_chunk, j_chunk in cross_brand_pair_chunks(prices, brand_ids(bottles), max_diff):
+        yield from zip(i_chunk.tolist(), j_chunk.tolist())
+
+
+def cross_brand_pair_chunks(prices: np.ndarray, brands: np.ndarray, max_diff: float = 10,
+                            chunk: int = 65536):
+    """
+    Array form of cross_brand_pairs for columnar catalogs: yields (i, j)
+    int64 arrays of roughly `chunk` pairs each, same pairs, same order.
+    """
+    n = len(prices)
+    if n < 2:
+        return
+
+    order = np.argsort(prices, kind="stable")
+    sorted_prices = prices[order]
+    lo = np.searchsorted(sorted_prices, prices - max_diff - _EPS, side="left")
+    hi = np.searchsorted(sorted_prices, prices + max_diff + _EPS, side="right")
+
+    bi, bj, size = [], [], 0
+    for i in range(n):
+        window = order[lo[i]:hi[i]]
+        window = window[window > i]
+        if not window.size:
+            continue
+        keep = (brands[window] != brands[i]) & (np.abs(prices[i] - prices[window]) <= max_diff)
+        js = np.sort(window[keep])
+        if not js.size:
+            continue
+        bi.append(np.full(js.size, i, dtype=np.int64))
+        bj.append(js)
+        size += js.size
+        if size >= chunk:
+            yield np.concatenate(bi), np.concatenate(bj)
+            bi, bj, size = [], [], 0
+    if size:
+        yield np.concatenate(bi), np.concatenate(bj)
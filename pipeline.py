@@ -0,0 +1,129 @@
+# pipeline.py
+# ---------------------------------------------------------------
+# Tiny staged pipeline: thread workers per stage, bounded queues in
+# between. A full queue blocks the stage feeding it (backpressure), so
+# every stage runs at once on different items and end-to-end time
+# tracks the slowest stage instead of the sum of all stages.
+# ---------------------------------------------------------------
+
+import queue
+import threading
+import time
+
+from metrics import observe
+
+_DONE = object()        # end-of-stream marker
+_DROPPED = object()     # item whose stage function raised
+
+
+class Stage:
+    def __init__(self, name: str, fn, workers: int = 1, queue_size: int = 8):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.inbox: queue.Queue = queue.Queue(maxsize=max(1, queue_size))
+        self.busy = 0
+        self.done = 0
+        self.failed = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def status(self) -> str:
+        return (f"{self.name} q={self.inbox.qsize()}/{self.inbox.maxsize} "
+                f"busy={self.busy}/{self.workers} done={self.done}")
+
+
+class Pipeline:
+    """
+    p = Pipeline([Stage("compose", f, 4), Stage("describe", g, 8)])
+    for item in p.run(items): ...
+
+    Items leave run() in input order. If a stage function raises, the
+    error is printed and that item is dropped. Queue depths are printed
+    every `report_every` seconds, with a per-stage summary at the end.
+    """
+
+    def __init__(self, stages: list[Stage], report_every: float = 10.0,
+                 out_queue_size: int = 8):
+        self.stages = stages
+        self.report_every = report_every
+        self.out: queue.Queue = queue.Queue(maxsize=max(1, out_queue_size))
+
+    def _worker(self, idx: int):
+        stage = self.stages[idx]
+        nxt = self.stages[idx + 1].inbox if idx + 1 < len(self.stages) else self.out
+        while True:
+            msg = stage.inbox.get()
+            if msg is _DONE:
+                stage.inbox.put(_DONE)          # let sibling workers see it too
+                return
+            seq, item = msg
+            if item is not _DROPPED:
+                with stage._lock:
+                    stage.busy += 1
+                t0 = time.perf_counter()
+                try:
+                    item = stage.fn(item)
+                except Exception as e:
+                    print(f"[pipe] {stage.name} failed: {e}")
+                    item = _DROPPED
+                dt = time.perf_counter() - t0
+                with stage._lock:
+                    stage.failed += item is _DROPPED
+                    stage.busy -= 1
+                    stage.done += 1
+                    stage.seconds += dt
+                observe(f"stage.{stage.name}", dt)
+            nxt.put((seq, item))                # blocks when downstream is full
+
+    def _reporter(self, stop: threading.Event):
+        while not stop.wait(self.report_every):
+            print("[pipe] " + " | ".join(s.status() for s in self.stages)
+                  + f" | out q={self.out.qsize()}")
+
+    def run(self, items):
+        threads = []
+        for idx, stage in enumerate(self.stages):
+            for _ in range(stage.workers):
+                t = threading.Thread(target=self._worker, args=(idx,), daemon=True)
+                t.start()
+                threads.append((idx, t))
+
+        stop = threading.Event()
+        threading.Thread(target=self._reporter, args=(stop,), daemon=True).start()
+
+        def feed():
+            for seq, item in enumerate(items):
+                self.stages[0].inbox.put((seq, item))
+            self.stages[0].inbox.put(_DONE)
+        threading.Thread(target=feed, daemon=True).start()
+
+        # close each stage once every worker of the previous one has exited
+        def closer():
+            for idx, stage in enumerate(self.stages):
+                for i, t in threads:
+                    if i == idx:
+                        t.join()
+                nxt = self.stages[idx + 1].inbox if idx + 1 < len(self.stages) else self.out
+                nxt.put(_DONE)
+        threading.Thread(target=closer, daemon=True).start()
+
+        # hand results back in input order
+        pending, want = {}, 0
+        try:
+            while True:
+                msg = self.out.get()
+                if msg is _DONE:
+                    break
+                seq, item = msg
+                pending[seq] = item
+                while want in pending:
+                    item = pending.pop(want)
+                    want += 1
+                    if item is not _DROPPED:
+                        yield item
+        finally:
+            stop.set()
+            for s in self.stages:
+                print(f"[pipe] {s.name}: {s.done} items, {s.failed} failed, "
+                      f"{s.seconds:.1f}s busy over {s.workers} worker(s)")
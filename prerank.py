@@ -0,0 +1,95 @@
+# prerank.py
+# ---------------------------------------------------------------
+# Free local pre-ranker for candidate pairs. Every rule-passing pair is
+# scored in NumPy from features we already have (brand, price, volume,
+# expression words in the name); only the best K go on to paid AI
+# scoring. A heuristic, not a model: it just has to keep the pairs the
+# LLM would rank highly inside the top K.
+# ---------------------------------------------------------------
+
+import numpy as np
+
+from pair_engine import brand_ids
+
+# expression classes; "extra añejo" must be tested before "añejo"
+_EXPRESSIONS = (
+    (4, ("extra añejo", "extra anejo")),
+    (3, ("añejo", "anejo", "cristalino")),
+    (2, ("reposado",)),
+    (1, ("blanco", "silver", "plata")),
+)
+
+# weights of the local score (they sum to 100)
+WEIGHTS = {
+    "same_brand":  25,    # same-brand pairs read as a curated set
+    "price_ratio": 30,    # cheaper / dearer bottle – balanced pairs
+    "same_volume": 10,
+    "expression":  25,    # two different known expressions = a flight
+    "price_level": 10,    # premium pairs make better gifts
+}
+
+
+def expression(name: str) -> int:
+    """0 = unknown, 1 blanco, 2 reposado, 3 añejo, 4 extra añejo."""
+    text = name.lower()
+    for code, words in _EXPRESSIONS:
+        if any(w in text for w in words):
+            return code
+    return 0
+
+
+def bottle_features(bottles: list[dict], volume_of) -> dict[str, np.ndarray]:
+    """Per-bottle arrays: brand id, price, volume (volume_of(bottle) → ml) and expression."""
+    n = len(bottles)
+    return {
+        "brand": brand_ids(bottles),
+        "price": np.fromiter((b["price"] for b in bottles), dtype=np.float64, count=n),
+        "volume": np.fromiter((volume_of(b) for b in bottles), dtype=np.int64, count=n),
+        "expr": np.fromiter((expression(b["name"]) for b in bottles), dtype=np.int8, count=n),
+    }
+
+
+def local_scores(feats: dict[str, np.ndarray], i: np.ndarray, j: np.ndarray) -> np.ndarray:
+    """0-100 score for every pair (i[k], j[k]) – one vectorised pass."""
+    price = feats["price"]
+    lo = np.minimum(price[i], price[j])
+    hi = np.maximum(price[i], price[j])
+    ratio = np.divide(lo, hi, out=np.zeros_like(lo), where=hi > 0)
+
+    ei, ej = feats["expr"][i], feats["expr"][j]
+    known = (ei > 0) & (ej > 0)
+    expr = np.where(known & (ei != ej), 1.0, np.where(known, 0.6, 0.3))
+
+    # scaled by the catalog's price range, not this batch's, so scores
+    # from different chunks of one catalog are comparable
+    floor, ceil = (np.log1p(price.min()), np.log1p(price.max())) if price.size else (0.0, 0.0)
+    level = (np.log1p(lo) - floor) / (ceil - floor) if ceil > floor else np.zeros_like(lo)
+
+    return (WEIGHTS["same_brand"] * (feats["brand"][i] == feats["brand"][j])
+            + WEIGHTS["price_ratio"] * ratio
+            + WEIGHTS["same_volume"] * (feats["volume"][i] == feats["volume"][j])
+            + WEIGHTS["expression"] * expr
+            + WEIGHTS["price_level"] * level)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the k best scores, returned in ascending index order so
+    the survivors keep their original (stream) order. Ties go to the
+    earlier candidate. O(n): one partition, no full sort.
+    """
+    if k >= scores.size:
+        return np.arange(scores.size)
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    cut = scores[np.argpartition(scores, scores.size - k)[scores.size - k]]     # k-th best
+    above = np.flatnonzero(scores > cut)
+    tied = np.flatnonzero(scores == cut)[:k - above.size]
+    return np.union1d(above, tied)
+
+
+def overlap(picked: list[str], reference: list[str]) -> float:
+    """Share of `reference` (full-scoring top N) that `picked` also contains."""
+    if not reference:
+        return 1.0
+    return len(set(picked) & set(reference)) / len(reference)
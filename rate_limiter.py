@@ -0,0 +1,74 @@
+# rate_limiter.py
+# ---------------------------------------------------------------
+# Token-bucket limiter for OpenAI calls (requests + tokens / min),
+# shared by every worker thread, with adaptive back-off on 429s.
+# ---------------------------------------------------------------
+
+import random
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Two buckets refilled continuously: one for requests per minute, one
+    for tokens per minute. `acquire()` blocks until both have room.
+
+    On a 429 call `backoff()`: every worker pauses and the refill rate is
+    halved. Each success via `relax()` creeps the rate back up to the
+    configured ceiling (AIMD, like TCP congestion control).
+    """
+
+    def __init__(self, requests_per_min: float = 500, tokens_per_min: float = 200_000,
+                 min_scale: float = 0.05):
+        self.rpm = float(requests_per_min)
+        self.tpm = float(tokens_per_min)
+        self.min_scale = min_scale
+        self.scale = 1.0                       # current fraction of the configured rate
+        self._req = self.rpm                   # start full
+        self._tok = self.tpm
+        self._stamp = time.monotonic()
+        self._paused_until = 0.0
+        self._strikes = 0
+        self._lock = threading.Lock()
+
+    # -- internals ------------------------------------------------
+    def _refill(self, now: float):
+        elapsed = now - self._stamp
+        self._stamp = now
+        self._req = min(self.rpm, self._req + elapsed * self.rpm * self.scale / 60)
+        self._tok = min(self.tpm, self._tok + elapsed * self.tpm * self.scale / 60)
+
+    # -- public ---------------------------------------------------
+    def acquire(self, tokens: int = 1):
+        """Block until one request and `tokens` tokens are available."""
+        tokens = min(tokens, self.tpm)         # a single oversized call must still pass
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._paused_until - now
+                if wait <= 0:
+                    if self._req >= 1 and self._tok >= tokens:
+                        self._req -= 1
+                        self._tok -= tokens
+                        return
+                    rate = self.scale / 60
+                    wait = max((1 - self._req) / (self.rpm * rate),
+                               (tokens - self._tok) / (self.tpm * rate))
+            time.sleep(min(max(wait, 0.01), 5))
+
+    def backoff(self):
+        """Register a 429: pause everyone (exponential + jitter) and halve the rate."""
+        with self._lock:
+            self._strikes += 1
+            self.scale = max(self.min_scale, self.scale / 2)
+            delay = min(60, 2 ** self._strikes) * (0.5 + random.random() / 2)
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            return delay
+
+    def relax(self):
+        """Register a success: reset strikes and recover 5 % of the rate."""
+        with self._lock:
+            self._strikes = 0
+            self.scale = min(1.0, self.scale + 0.05)
@@ -1,31 +1,39 @@
 # scraper.py
 
-import re, os
-import time
+import re
+import atexit
+import threading
 import requests
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
-def save_image(url: str, folder: str = "images") -> str | None:       
-    """Download URL to /images, return local path or None on failure."""  
-    os.makedirs(folder, exist_ok=True)                                   
-    fname = url.split('/')[-1].split('?')[0]                              
-    path  = os.path.join(folder, fname)                                  
-    if os.path.exists(path):                                             
-        return path                                                      
-    try:                                                               
-        r = requests.get(url, timeout=20)                               
-        if r.status_code == 200:                                       
-            with open(path, "wb") as f: f.write(r.content)               
-            return path                                                   
-    except Exception as e:                                               
-        print(f"[img] {e}")                                               
-    return None               
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from bs4 import BeautifulSoup, SoupStrainer
+try:
+    import lxml.html
+    from lxml import etree
+except ImportError:                 # optional: parse_products_fast falls back to bs4
+    lxml = None
+from image_store import ImageDownloader
+from catalog_snapshot import CatalogSnapshot
+from metrics import timed, timer
+from browser_pool import BrowserPool
+_image_stores: dict[str, ImageDownloader] = {}      # folder → downloader shared by save_image
+_image_stores_lock = threading.Lock()
+
+
+@timed("save_image")
+def save_image(url: str, folder: str = "images") -> str | None:
+    """
+    Download URL to /images (content-addressed), return local path or None
+    on failure. A URL already in the store returns its file without a request.
+    """
+    with _image_stores_lock:
+        store = _image_stores.get(folder)
+        if store is None:
+            store = _image_stores[folder] = ImageDownloader(folder, workers=1)
+            atexit.register(store.close)            # index written once, not per image
+    return store.stored_path(url) or store.download(url)
 def looks_like_bundle(name: str) -> bool:
     """Return True if product title suggests it is already a bundle."""
     return any(word in name.lower() for word in [
@@ -44,82 +52,298 @@ def clean_text(text: str) -> str:
     """Remove unwanted characters and whitespace from a string."""
     return re.sub(r'[^\w\s-]', '', text).strip()
 
-def scrape_bottlebuzz_category(category_url: str, total_pages: int = 5) -> list[dict]:
+HTTP_HEADERS = {
+    "User-Agent": ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                   "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"),
+    "Accept": "text/html,application/xhtml+xml",
+}
+
+def make_session(pool_size: int = 8) -> requests.Session:
+    """requests.Session with a keep-alive pool and retries on 429/5xx."""
+    session = requests.Session()
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(HTTP_HEADERS)
+    return session
+
+PARSE_WORKERS = 2    # pages parsed in the background while the next ones load
+
+def _card_product(name_text: str, brand_text: str, price_text: str, raw_src: str) -> dict | None:
+    """Product dict from one grid card's raw field texts; None if it's skipped."""
+    name = clean_text(name_text)
+    if looks_like_bundle(name):
+        return None
+    brand = clean_text(brand_text)
+    # Some sites have the price in different formats; handle carefully:
+    price = extract_price(price_text)
+    if price is None:
+        print(f"[!] No price found for {name}")
+        return None
+
+    # data-srcset may be "url 600w, url2 1200w" – take first URL token
+    raw_src = raw_src.split(',')[0].strip().split()[0]
+
+    if raw_src.startswith('//'):
+        raw_src = 'https:' + raw_src
+    return {
+        'name': name,
+        'brand': brand,
+        'price': price,
+        'image_url': raw_src,
+    }
+
+def _soup_cards(items) -> list[dict]:
+    products = []
+    for item in items[:40]:
+        name_elem = item.find('div', class_='grid-product__title')
+        brand_elem = item.find('div', class_='grid-product__vendor')
+        price_elem = item.find('span', class_='grid-product__price--current')
+        image_elem = item.find('img')
+
+        if not name_elem or not brand_elem or not price_elem or not image_elem:
+            continue
+
+        raw_src = (
+            image_elem.get('data-src')      or
+            image_elem.get('data-srcset')   or
+            image_elem.get('src')           or ''
+        )
+        product = _card_product(name_elem.text, brand_elem.text,
+                                price_elem.get_text(" ", strip=True),  # join text nodes with spaces
+                                raw_src)
+        if product:
+            products.append(product)
+    return products
+
+def parse_products(html: str) -> tuple[int, list[dict]]:
     """
-    Scrapes 'BottleBuzz' for a specific category (e.g., Tequila),
-    returning a list of product dicts with keys: name, brand, price, image_url.
+    Parse one collection page.
+    Returns (number of grid items seen, product dicts without image_path).
     """
+    soup = BeautifulSoup(html, 'html.parser')
+    items = soup.find_all('div', class_='grid-item')
+    return len(items), _soup_cards(items)
 
-    chrome_options = Options()
-    # e.g. run headless for speed:
-    # chrome_options.add_argument("--headless")
+# -- fast path: lxml, grid cards only --------------------------------
+def _has_class(tag: str, cls: str) -> str:
+    return f'{tag}[contains(concat(" ", normalize-space(@class), " "), " {cls} ")]'
 
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=chrome_options)
+if lxml is not None:
+    _CARDS = etree.XPath('//' + _has_class('div', 'grid-item'))
+    _TITLE = etree.XPath('.//' + _has_class('div', 'grid-product__title'))
+    _VENDOR = etree.XPath('.//' + _has_class('div', 'grid-product__vendor'))
+    _PRICE = etree.XPath('.//' + _has_class('span', 'grid-product__price--current'))
+    _IMG = etree.XPath('.//img')
 
-    results = []
-    for page_num in range(1, total_pages + 1):
-        page_url = f"{category_url}?page={page_num}"
-        driver.get(page_url)
+# while parsing, the strainer sees the raw class string ("grid-item grid-product")
+_CARD_STRAINER = SoupStrainer('div', class_=lambda c: bool(c) and 'grid-item' in c.split())
 
-        try:
-            WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located((By.CLASS_NAME, 'grid-item'))
-            )
-        except:
-            print(f"[!] Page {page_num} load timeout. Skipping.")
-            continue
+_NOT_TEXT = {'script', 'style', 'template'}     # bs4's get_text() skips these too
+
+def _strings(el):
+    """Text nodes under `el` in document order, as bs4 sees them (no comments or scripts)."""
+    if el.text:
+        yield el.text
+    for child in el:
+        if isinstance(child.tag, str) and child.tag not in _NOT_TEXT:
+            yield from _strings(child)
+        if child.tail:
+            yield child.tail
 
-        time.sleep(2)  # Adjust as needed for site responsiveness
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
+def parse_products_fast(html: str) -> tuple[int, list[dict]]:
+    """
+    parse_products() for pages where only the grid-item cards matter:
+    libxml2 builds the tree, one compiled XPath picks the cards and field
+    lookups stay inside each card. Same return value as parse_products().
+    Without lxml, BeautifulSoup keeps only the cards (SoupStrainer).
+    """
+    if lxml is None:
+        soup = BeautifulSoup(html, 'html.parser', parse_only=_CARD_STRAINER)
         items = soup.find_all('div', class_='grid-item')
+        return len(items), _soup_cards(items)
+
+    try:    # bytes + explicit encoding: str input may carry its own <?xml encoding?>
+        doc = lxml.html.document_fromstring(html.encode('utf-8'),
+                                            parser=lxml.html.HTMLParser(encoding='utf-8'))
+    except etree.ParserError:           # empty document
+        return 0, []
+    items = _CARDS(doc)
+    products = []
+    for item in items[:40]:
+        name_elem, brand_elem = _TITLE(item)[:1], _VENDOR(item)[:1]
+        price_elem, image_elem = _PRICE(item)[:1], _IMG(item)[:1]
+        if not name_elem or not brand_elem or not price_elem or not image_elem:
+            continue
+        img = image_elem[0]
+        raw_src = img.get('data-src') or img.get('data-srcset') or img.get('src') or ''
+        price_text = " ".join(t.strip() for t in _strings(price_elem[0]) if t.strip())
+        product = _card_product("".join(_strings(name_elem[0])), "".join(_strings(brand_elem[0])),
+                                price_text, raw_src)
+        if product:
+            products.append(product)
+    return len(items), products
+
+def _parsed_pages(pages, parse=parse_products_fast, workers: int = PARSE_WORKERS):
+    """
+    (page_num, html | None) → (page_num, (n_items, products) | None), in
+    page order. Pages are parsed on a small thread pool while `pages` goes
+    on fetching; at most `workers` pages are read ahead of the consumer.
+    """
+    def run(html):
+        with timer("scrape.parse"):
+            return parse(html)
+
+    pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="parse")
+    pending = deque()
+    try:
+        for page_num, html in pages:
+            pending.append((page_num, None if html is None else pool.submit(run, html)))
+            while pending and (len(pending) > workers or pending[0][1] is None
+                               or pending[0][1].done()):
+                page_num, fut = pending.popleft()
+                yield page_num, fut and fut.result()
+        while pending:
+            page_num, fut = pending.popleft()
+            yield page_num, fut and fut.result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        close = getattr(pages, "close", None)
+        if close:
+            close()             # stop the fetcher (drops queued pages / quits the browser)
+
+def _collect(pages, results: list[dict], downloads: list, downloader: ImageDownloader,
+             snapshot: CatalogSnapshot | None = None) -> bool:
+    """
+    Consume (page_num, html | None) in page order – parsed in the
+    background while later pages load – appending products and
+    queueing their images as (product, Future) in `downloads`. Products
+    whose image URL is unchanged in `snapshot` reuse last run's file.
+    Returns False if page 1 failed to load or had no product grid at all.
+    """
+    for page_num, parsed in _parsed_pages(pages):
+        if parsed is None:
+            if page_num == 1:       # blocked/failed outright – same as "no grid" for auto
+                print("[!] Page 1 failed to load.")
+                return False
+            print(f"[!] Page {page_num} load timeout. Skipping.")
+            continue
 
-        if not items:
+        n_items, products = parsed
+        if not n_items:
             print(f"[!] No products found on page {page_num}. Stopping.")
+            if page_num == 1:
+                return False
             break
 
-        for item in items[:40]:
-            name_elem = item.find('div', class_='grid-product__title')
-            brand_elem = item.find('div', class_='grid-product__vendor')
-            price_elem = item.find('span', class_='grid-product__price--current')
-            image_elem = item.find('img')
-
-            if not name_elem or not brand_elem or not price_elem or not image_elem:
-                continue
-
-            name = clean_text(name_elem.text)
-            if looks_like_bundle(name):
-                continue    
-            brand = clean_text(brand_elem.text)
-            # Some sites have the price in different formats; handle carefully:
-            raw = price_elem.get_text(" ", strip=True)  # join text nodes with spaces
-            price = extract_price(raw)
-            if price is None:
-                print(f"[!] No price found for {name}")
-                continue      
-
-            raw_src = (
-                image_elem.get('data-src')      or
-                image_elem.get('data-srcset')   or
-                image_elem.get('src')           or ''
-            )
-
-            # data-srcset may be "url 600w, url2 1200w" – take first URL token
-            raw_src = raw_src.split(',')[0].strip().split()[0]
-
-            if raw_src.startswith('//'):
-                raw_src = 'https:' + raw_src
-            image_url   = raw_src
-            image_local = save_image(image_url)   # downloads to /images
-            product_data = {
-                'name': name,
-                'brand': brand,
-                'price': price,
-                'image_url': image_url,
-                'image_path' : image_local or '' 
-            }
+        for product_data in products:
+            cached = snapshot.cached_image(product_data) if snapshot else None
+            if cached:
+                product_data['image_path'] = cached
+            else:
+                product_data['image_path'] = ''       # filled in once the download lands
+                downloads.append((product_data, downloader.submit(product_data['image_url'])))
             results.append(product_data)
 
-        print(f"[+] Page {page_num} scraped ({len(items)} items found).")
+        print(f"[+] Page {page_num} scraped ({n_items} items found).")
+    return True
+
+def _browser_pages(category_url: str, total_pages: int, pool: BrowserPool | None = None):
+    """
+    Yield (page_num, page_source | None) rendered by headless Chrome.
+    Uses `pool`'s live drivers if given; otherwise starts a pool just for
+    this call and shuts it down afterwards.
+    """
+    own_pool = pool is None
+    pool = pool or BrowserPool()
+    try:
+        yield from pool.pages(category_url, total_pages)
+    finally:
+        if own_pool:
+            pool.close()
+
+def _http_pages(category_url: str, total_pages: int, session: requests.Session | None = None,
+                workers: int = 4):
+    """
+    Yield (page_num, html | None) in page order. All pages are requested
+    concurrently over one pooled session; no browser involved.
+    """
+    session = session or make_session(workers)
+
+    def fetch(page_num):
+        try:
+            with timer("scrape.page_fetch"):
+                r = session.get(category_url, params={"page": page_num}, timeout=20)
+            if r.status_code == 200:
+                return r.text
+            print(f"[!] Page {page_num} → HTTP {r.status_code}")
+        except requests.RequestException as e:
+            print(f"[!] Page {page_num} → {e}")
+        return None
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [pool.submit(fetch, n) for n in range(1, total_pages + 1)]
+        try:
+            for page_num, fut in enumerate(futures, 1):
+                yield page_num, fut.result()
+        finally:
+            for fut in futures:      # caller stopped early – drop queued pages
+                fut.cancel()
+
+@timed("scrape")
+def scrape_bottlebuzz_category(category_url: str, total_pages: int = 5,
+                               backend: str = "auto",
+                               session: requests.Session | None = None,
+                               workers: int = 4,
+                               downloader: ImageDownloader | None = None,
+                               snapshot: CatalogSnapshot | None = None,
+                               browser: BrowserPool | None = None) -> list[dict]:
+    """
+    Scrapes 'BottleBuzz' for a specific category (e.g., Tequila),
+    returning a list of product dicts with keys: name, brand, price,
+    image_url, image_path.
+
+    backend:
+      • "http"    – plain pooled HTTP, pages fetched concurrently (no browser)
+      • "browser" – headless Chrome (Selenium), for pages that need JS
+                    rendering; pages render in parallel on `browser`, a
+                    BrowserPool whose drivers stay alive across calls
+                    (the caller closes it), or on a pool made for this call
+      • "auto"    – HTTP first; falls back to the browser if page 1 has no
+                    product grid in the raw HTML
+
+    Images download on `downloader`'s worker pool while pages are still
+    being parsed; image_path is filled in before returning. Pass a shared
+    ImageDownloader to reuse its pool across calls (the caller closes it).
+
+    With a CatalogSnapshot from the previous run, bottles whose image URL
+    hasn't changed skip the download and keep their stored image_path.
+    The snapshot itself is not modified – diff/update/save it afterwards.
+    """
+    if backend not in ("auto", "http", "browser"):
+        raise ValueError(f"unknown backend {backend!r}")
+
+    own_downloader = downloader is None
+    downloader = downloader or ImageDownloader("images")
+    try:
+        results, downloads = [], []
+        found = False
+        if backend in ("auto", "http"):
+            found = _collect(_http_pages(category_url, total_pages, session, workers),
+                             results, downloads, downloader, snapshot)
+            if not found and backend == "auto":
+                print("[i] Page 1 failed or had no product grid over HTTP — falling back to the browser.")
+        if backend == "browser" or (backend == "auto" and not found):
+            results, downloads = [], []
+            _collect(_browser_pages(category_url, total_pages, browser), results, downloads,
+                     downloader, snapshot)
 
-    driver.quit()
+        for product_data, fut in downloads:
+            product_data['image_path'] = fut.result() or ''
+    finally:
+        if own_downloader:
+            downloader.close()
+        else:
+            downloader.flush()
     return results
@@ -0,0 +1,146 @@
+# sqlite_cache.py
+# ---------------------------------------------------------------
+# Small persistent key → JSON-value cache on SQLite.
+#  • per-entry reads/writes (startup cost doesn't grow with the cache)
+#  • namespaces carry model + prompt version, so a prompt change
+#    never serves stale answers
+#  • TTL and size-based eviction
+#  • WAL mode: several processes (e.g. one per category) can share it
+# ---------------------------------------------------------------
+
+import json
+import sqlite3
+import threading
+import time
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    ns      TEXT NOT NULL,
+    key     TEXT NOT NULL,
+    value   TEXT NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (ns, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cache_age ON cache (ns, created);
+"""
+
+_SEP = "\x1f"          # unit separator – never appears in product names
+_MISSING = object()
+
+
+def pair_key(a: str, b: str) -> str:
+    """Order-independent key: pair_key(a, b) == pair_key(b, a)."""
+    return _SEP.join(sorted((a, b)))
+
+
+class SqliteCache:
+    """
+    Dict-ish cache stored in one SQLite file.
+
+    `namespace` should include whatever invalidates an answer – e.g.
+    f"score:{model}:{prompt_version}". `ttl` is in seconds; entries older
+    than that read as missing. `max_entries` caps the namespace; `evict()`
+    drops expired rows and then the oldest beyond the cap.
+    """
+
+    def __init__(self, path: str, namespace: str, ttl: float | None = None,
+                 max_entries: int | None = None):
+        self.path = path
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False,
+                                   isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    # -- reads ----------------------------------------------------
+    def _min_created(self) -> float:
+        return time.time() - self.ttl if self.ttl else 0.0
+
+    def get(self, key: str, default=None):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM cache WHERE ns=? AND key=? AND created>=?",
+                (self.namespace, key, self._min_created()),
+            ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def get_many(self, keys) -> dict:
+        """Return {key: value} for the keys that are cached (missing keys are absent)."""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), 500):          # stay under SQLite's variable limit
+                part = keys[i:i + 500]
+                rows = self._db.execute(
+                    f"SELECT key, value FROM cache WHERE ns=? AND created>=? "
+                    f"AND key IN ({','.join('?' * len(part))})",
+                    (self.namespace, self._min_created(), *part),
+                )
+                found.update((k, json.loads(v)) for k, v in rows)
+        return found
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __getitem__(self, key: str):
+        val = self.get(key, _MISSING)
+        if val is _MISSING:
+            raise KeyError(key)
+        return val
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM cache WHERE ns=? AND created>=?",
+                (self.namespace, self._min_created()),
+            ).fetchone()[0]
+
+    # -- writes ---------------------------------------------------
+    def set(self, key: str, value):
+        self.set_many({key: value})
+
+    __setitem__ = set
+
+    def set_many(self, items: dict):
+        if not items:
+            return
+        now = time.time()
+        rows = [(self.namespace, k, json.dumps(v, ensure_ascii=False), now)
+                for k, v in items.items()]
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO cache (ns, key, value, created) VALUES (?, ?, ?, ?)",
+                    rows,
+                )
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def evict(self) -> int:
+        """Drop expired rows, then the oldest rows beyond max_entries. Returns rows removed."""
+        removed = 0
+        with self._lock:
+            if self.ttl:
+                removed += self._db.execute(
+                    "DELETE FROM cache WHERE ns=? AND created<?",
+                    (self.namespace, self._min_created()),
+                ).rowcount
+            if self.max_entries is not None:
+                removed += self._db.execute(
+                    "DELETE FROM cache WHERE ns=? AND key IN ("
+                    "  SELECT key FROM cache WHERE ns=? ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                    (self.namespace, self.namespace, self.max_entries),
+                ).rowcount
+        return removed
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
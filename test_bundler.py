@@ -0,0 +1,141 @@
+# test_bundler.py
+#   python -m pytest test_bundler.py     (or: python -m unittest test_bundler)
+# The price-only bundler against plain itertools references on seeded
+# random catalogs: the chunked pair engine must give exactly the bundles
+# of the original implementation, and the pruned 3-bottle search the same
+# sets as trying every triple.
+
+import io
+import itertools
+import random
+import unittest
+from contextlib import redirect_stdout
+
+import bundler
+from bundler import extract_volume, round_to_99
+from pair_engine import cross_brand_pairs
+
+BRANDS = ["Casa Azul", "casa azul", "Don Noble", "Dragones", "El Tesoro", "Fortaleza", "Ocho"]
+EXPRESSIONS = ["Blanco", "Reposado", "Añejo", "Extra Añejo"]
+VOLUMES = ["750ml", "750 ml", "1.5L", "1.75 L", "375ml", ""]
+
+
+def random_catalog(n: int, seed: int) -> list[dict]:
+    """n scraper-shaped bottles; few brands (mixed case) and repeated prices, so rules and ties bite."""
+    r = random.Random(seed)
+    prices = [round(r.uniform(20, 120), 2) for _ in range(max(1, n // 3))]
+    return [{
+        "name": f"{brand} {r.choice(EXPRESSIONS)} {r.choice(VOLUMES)} #{i}",
+        "brand": brand,
+        "price": r.choice(prices) if r.random() < 0.3 else round(r.uniform(20, 120), 2),
+        "image_url": "",
+        "image_path": "",
+    } for i, brand in enumerate(r.choice(BRANDS) for _ in range(n))]
+
+
+def _valid(bottles: list[dict]) -> list[dict]:
+    return [b for b in bottles
+            if (extract_volume(b["name"]) or extract_volume(b["brand"])) in (750, 1500)]
+
+
+def _fits(b1: dict, b2: dict) -> bool:
+    return b1["brand"].lower() == b2["brand"].lower() or abs(b1["price"] - b2["price"]) <= 10
+
+
+def baseline_pairs(bottles: list[dict], existing: set, max_bundles: int = 10) -> list[dict]:
+    """The original itertools implementation: same-brand groups first, then cross-brand ≤ $10."""
+    valid = _valid(bottles)
+    brand_map: dict[str, list[dict]] = {}
+    for b in valid:
+        brand_map.setdefault(b["brand"].lower(), []).append(b)
+    same = [pair for group in brand_map.values() for pair in itertools.combinations(group, 2)]
+    cross = [(b1, b2) for b1, b2 in itertools.combinations(valid, 2)
+             if b1["brand"].lower() != b2["brand"].lower() and abs(b1["price"] - b2["price"]) <= 10]
+    bundles = [{"name": f"{b1['name']} & {b2['name']}",
+                "price": round_to_99((b1["price"] + b2["price"]) - 5),
+                "bottles": [b1, b2]}
+               for b1, b2 in same + cross if f"{b1['name']} & {b2['name']}" not in existing]
+    bundles.sort(key=lambda b: b["price"], reverse=True)
+    return bundles[:max_bundles]
+
+
+def brute_force_triples(bottles: list[dict], existing: set) -> dict[str, float]:
+    """name → price of every rule-passing 3-bottle set (every pair inside it fits)."""
+    return {
+        " & ".join(b["name"] for b in trio): round_to_99(sum(b["price"] for b in trio) - 5)
+        for trio in itertools.combinations(_valid(bottles), 3)
+        if all(_fits(x, y) for x, y in itertools.combinations(trio, 2))
+        and " & ".join(b["name"] for b in trio) not in existing
+    }
+
+
+def generate(bottles, existing, **kw) -> list[dict]:
+    with redirect_stdout(io.StringIO()):
+        return bundler.generate_bundles(bottles, existing, **kw)
+
+
+class PairBundlesTest(unittest.TestCase):
+    def test_cross_brand_pairs_match_itertools(self):
+        for seed in range(10):
+            bottles = random_catalog(80, seed)
+            expected = [(i, j) for i, j in itertools.combinations(range(len(bottles)), 2)
+                        if bottles[i]["brand"].lower() != bottles[j]["brand"].lower()
+                        and abs(bottles[i]["price"] - bottles[j]["price"]) <= 10]
+            self.assertEqual(list(cross_brand_pairs(bottles, max_diff=10)), expected)
+
+    def test_same_bundles_as_baseline(self):
+        for seed in range(20):
+            bottles = random_catalog(20 + 15 * seed, seed)
+            for max_bundles in (1, 10, 1000):
+                with self.subTest(seed=seed, max_bundles=max_bundles):
+                    self.assertEqual(generate(bottles, set(), max_bundles=max_bundles),
+                                     baseline_pairs(bottles, set(), max_bundles))
+
+    def test_same_bundles_as_baseline_with_existing(self):
+        for seed in range(20):
+            bottles = random_catalog(20 + 15 * seed, seed)
+            r = random.Random(seed)
+            # drop some of the best pairs, plus names that aren't catalog pairs at all
+            everything = baseline_pairs(bottles, set(), max_bundles=10**9)
+            existing = {b["name"] for b in everything[:15] if r.random() < 0.6}
+            existing |= {b["name"] for b in r.sample(everything, min(20, len(everything)))}
+            existing |= {"Not A Bottle & Another", f"{bottles[0]['name']} & {bottles[0]['name']}"}
+            with self.subTest(seed=seed):
+                self.assertEqual(generate(bottles, existing), baseline_pairs(bottles, existing))
+
+
+class TripleBundlesTest(unittest.TestCase):
+    def assertSameAsBruteForce(self, bottles, existing, max_bundles):
+        got = generate(bottles, existing, max_bundles=max_bundles, k=3)
+        sets = brute_force_triples(bottles, existing)
+        prices = sorted(sets.values(), reverse=True)[:max_bundles]
+
+        self.assertEqual([b["price"] for b in got], prices)
+        self.assertEqual(len({b["name"] for b in got}), len(got))
+        for b in got:
+            self.assertEqual(sets.get(b["name"]), b["price"], b["name"])
+            self.assertEqual(" & ".join(x["name"] for x in b["bottles"]), b["name"])
+        # ties at the cut may go either way; everything dearer must be in
+        if got:
+            cut = got[-1]["price"]
+            self.assertLessEqual({n for n, p in sets.items() if p > cut}, {b["name"] for b in got})
+
+    def test_same_sets_as_brute_force(self):
+        for seed in range(12):
+            bottles = random_catalog(15 + 5 * seed, seed)
+            for max_bundles in (1, 10, 10_000):
+                with self.subTest(seed=seed, max_bundles=max_bundles):
+                    self.assertSameAsBruteForce(bottles, set(), max_bundles)
+
+    def test_same_sets_as_brute_force_with_existing(self):
+        for seed in range(12):
+            bottles = random_catalog(15 + 5 * seed, seed)
+            r = random.Random(seed)
+            ranked = sorted(brute_force_triples(bottles, set()).items(), key=lambda kv: -kv[1])
+            existing = {name for name, _ in ranked[:20] if r.random() < 0.5}
+            with self.subTest(seed=seed):
+                self.assertSameAsBruteForce(bottles, existing, 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+# test_http_backend.py
+#   python -m pytest test_http_backend.py     (or: python -m unittest test_http_backend)
+# The HTTP scraping backend against a local http.server that serves the
+# saved collection pages in fixtures/. No network, no browser.
+
+import io
+import os
+import threading
+import unittest
+from concurrent.futures import Future
+from contextlib import redirect_stdout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+import scraper
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+EMPTY_PAGE = "<html><body><div class='grid'></div></body></html>"
+
+
+def fixture_page(page: int) -> str | None:
+    path = os.path.join(FIXTURES, f"collection_page_{page}.html")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    status_for_page: dict[int, int] = {}
+
+    def do_GET(self):
+        page = int(parse_qs(urlparse(self.path).query).get("page", ["1"])[0])
+        status = self.status_for_page.get(page, 200)
+        body = (fixture_page(page) or EMPTY_PAGE).encode("utf-8") if status == 200 else b"blocked"
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class _NoDownloads:
+    """ImageDownloader stand-in: every image 'lands' at once, nothing is fetched."""
+
+    def submit(self, url):
+        fut = Future()
+        fut.set_result(f"images/{abs(hash(url))}.jpg")
+        return fut
+
+    def flush(self):
+        pass
+
+
+def _expected() -> list[dict]:
+    products = []
+    page = 1
+    while (html := fixture_page(page)) is not None:
+        products += scraper.parse_products(html)[1]
+        page += 1
+    return products
+
+
+class HttpBackendTest(unittest.TestCase):
+    def setUp(self):
+        handler = type("Handler", (_Handler,), {"status_for_page": {}})
+        self.handler = handler
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/collections/tequila"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def scrape(self, **kw):
+        with redirect_stdout(io.StringIO()):
+            return scraper.scrape_bottlebuzz_category(self.url, total_pages=4,
+                                                      downloader=_NoDownloads(), **kw)
+
+    def test_products_match_parse_products(self):
+        got = self.scrape(backend="http")
+        self.assertTrue(got)
+        self.assertTrue(all(p["image_path"] for p in got))
+        self.assertEqual([{k: v for k, v in p.items() if k != "image_path"} for p in got],
+                         _expected())
+
+    def test_fast_parser_matches_on_fixtures(self):
+        page = 1
+        while (html := fixture_page(page)) is not None:
+            with redirect_stdout(io.StringIO()):
+                self.assertEqual(scraper.parse_products_fast(html), scraper.parse_products(html))
+            page += 1
+
+    def test_auto_falls_back_when_page_1_fails(self):
+        self.handler.status_for_page[1] = 403
+        pages = [(n, fixture_page(n) or EMPTY_PAGE) for n in (1, 2, 3)]
+        with mock.patch.object(scraper, "_browser_pages", return_value=iter(pages)) as browser:
+            got = self.scrape(backend="auto")
+        browser.assert_called_once()
+        self.assertEqual([{k: v for k, v in p.items() if k != "image_path"} for p in got],
+                         _expected())
+
+    def test_http_only_does_not_fall_back(self):
+        self.handler.status_for_page[1] = 403
+        with mock.patch.object(scraper, "_browser_pages") as browser:
+            got = self.scrape(backend="http")
+        browser.assert_not_called()
+        self.assertEqual(got, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,12 @@
 # test_scrape.py  – small throw-away script
+#   python test_scrape.py [url] [auto|http|browser]
+# point `url` at a local fixture server to try a backend offline
+import sys
 from scraper import scrape_bottlebuzz_category
 
-tequila_url = "https://bottlebuzz.com/collections/tequila"
-bottles = scrape_bottlebuzz_category(tequila_url, total_pages=3)
+tequila_url = sys.argv[1] if len(sys.argv) > 1 else "https://bottlebuzz.com/collections/tequila"
+backend     = sys.argv[2] if len(sys.argv) > 2 else "auto"
+bottles = scrape_bottlebuzz_category(tequila_url, total_pages=3, backend=backend)
 
 # show first 10 for a quick sanity-check
 for b in bottles[:10]: